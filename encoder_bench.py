@@ -0,0 +1,73 @@
+"""Benchmark of the JPEG encoder backends on the sample frames.
+
+Encodes every sample frame with each backend and subsampling and reports encode time, throughput, output size and PSNR against
+the source frame, fastest first. Pick the backend for a deployment with the
+`encoder:` config section.
+
+Usage:
+  python encoder_bench.py --quality 80 --width 1920
+"""
+import argparse
+import glob
+import os
+import time
+import cv2
+import numpy as np
+
+from encoders import ENCODERS, create_encoder
+
+
+def load_frames(samples_dir, count, width=None):
+    frames = [cv2.imread(path) for path in sorted(glob.glob(os.path.join(samples_dir, "*.jpg")))[:count]]
+    if width:
+        frames = [cv2.resize(f, (width, round(f.shape[0] * width / f.shape[1]))) for f in frames]
+    return frames
+
+
+def bench(encoder, frames, quality, repeat):
+    encoder.encode(frames[0], quality)  # warm up
+    times, sizes, psnrs = [], [], []
+    for frame in frames:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            jpg_buffer = encoder.encode(frame, quality)
+            best = min(best, time.perf_counter() - start)
+        times.append(best)
+        sizes.append(len(jpg_buffer))
+        psnrs.append(cv2.PSNR(frame, cv2.imdecode(np.frombuffer(jpg_buffer, np.uint8), cv2.IMREAD_COLOR)))
+    return np.array(times), np.array(sizes), np.array(psnrs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JPEG encoder benchmark")
+    parser.add_argument("--samples", default="map_visualization/samples", help="Folder with sample JPEGs")
+    parser.add_argument("-n", type=int, default=20, help="Number of sample frames")
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--width", type=int, default=None, help="Resize frames to this width (e.g. 1920)")
+    parser.add_argument("--repeat", type=int, default=3, help="Encodes per frame, the fastest one counts")
+    parser.add_argument("--subsampling", nargs="+", default=["444", "422", "420"])
+    args = parser.parse_args()
+
+    frames = load_frames(args.samples, args.n, args.width)
+    if not frames:
+        raise SystemExit(f"No sample frames in {args.samples}")
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} frames {width}x{height}, quality {args.quality}")
+    results = []
+    for backend, cls in ENCODERS.items():
+        for subsampling in args.subsampling:
+            if subsampling not in cls.supported_subsamplings:
+                continue
+            encoder = create_encoder(backend, subsampling=subsampling)
+            times, sizes, psnrs = bench(encoder, frames, args.quality, args.repeat)
+            results.append((times.mean(), encoder.describe(), times, sizes, psnrs))
+    for _, name, times, sizes, psnrs in sorted(results, key=lambda r: r[0]):
+        print(
+            f"{name:22s}: {1000 * times.mean():6.2f} ms/frame, {width * height / times.mean() / 1e6:6.1f} MPix/s, "
+            f"{sizes.mean() / 1024:6.1f} KiB, PSNR {psnrs.mean():5.2f} dB"
+        )
+
+
+if __name__ == "__main__":
+    main()
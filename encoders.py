@@ -0,0 +1,108 @@
+"""JPEG encoders for BGR camera frames.
+
+All frames saved on the drone and sent to the GCS are encoded by the default
+encoder, set from the `encoder:` config section (create_encoder). Backends
+differ in speed and output size, `python encoder_bench.py` measures them on
+the sample frames:
+
+  simplejpeg - libjpeg-turbo, BGR input without conversion
+  opencv     - cv2.imencode (libjpeg or libjpeg-turbo, depends on the build)
+  pillow     - PIL (libjpeg-turbo in the wheels), needs a BGR to RGB copy
+
+Encoders keep their settings prepared once and are stateless otherwise, so a
+single instance is shared by the saving and sending threads.
+"""
+import io
+import logging
+import cv2
+import numpy as np
+import simplejpeg
+from PIL import Image
+
+SUBSAMPLINGS = ("444", "422", "420", "440", "411")
+
+
+class Encoder:
+    """Encodes BGR uint8 images to JPEG bytes with fixed chroma subsampling."""
+
+    name = None
+    supported_subsamplings = SUBSAMPLINGS
+
+    def __init__(self, subsampling: str = "420"):
+        subsampling = str(subsampling)
+        if subsampling not in self.supported_subsamplings:
+            raise ValueError(
+                f"{self.name} encoder does not support subsampling {subsampling}, "
+                f"use one of {self.supported_subsamplings}"
+            )
+        self.subsampling = subsampling
+
+    def encode(self, image: np.ndarray, quality: int) -> bytes:
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return f"{self.name} {self.subsampling}"
+
+
+class SimplejpegEncoder(Encoder):
+    name = "simplejpeg"
+
+    def encode(self, image: np.ndarray, quality: int) -> bytes:
+        # fastdct gives byte-identical output with the SIMD libjpeg-turbo of the wheels, so it is not offered
+        return simplejpeg.encode_jpeg(image, quality=quality, colorspace="BGR", colorsubsampling=self.subsampling)
+
+
+class OpenCVEncoder(Encoder):
+    name = "opencv"
+    sampling_factors = {
+        "444": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444,
+        "422": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+        "420": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+        "440": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_440,
+        "411": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_411,
+    }
+
+    def __init__(self, subsampling: str = "420"):
+        super().__init__(subsampling)
+        self.params = [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, self.sampling_factors[self.subsampling]]
+
+    def encode(self, image: np.ndarray, quality: int) -> bytes:
+        ok, jpg_buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality, *self.params])
+        if not ok:
+            raise RuntimeError("OpenCV could not encode the image")
+        return jpg_buffer.tobytes()
+
+
+class PillowEncoder(Encoder):
+    name = "pillow"
+    supported_subsamplings = ("444", "422", "420")
+    pillow_subsamplings = {"444": 0, "422": 1, "420": 2}
+
+    def encode(self, image: np.ndarray, quality: int) -> bytes:
+        rgb = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        output = io.BytesIO()
+        rgb.save(output, "JPEG", quality=quality, subsampling=self.pillow_subsamplings[self.subsampling])
+        return output.getvalue()
+
+
+ENCODERS = {encoder.name: encoder for encoder in (SimplejpegEncoder, OpenCVEncoder, PillowEncoder)}
+
+# encoder used for saved and sent frames
+_default = SimplejpegEncoder()
+
+
+def create_encoder(backend: str = "simplejpeg", **options) -> Encoder:
+    """Encoder of backend (simplejpeg, opencv or pillow) with subsampling option."""
+    if backend not in ENCODERS:
+        raise ValueError(f"Unknown JPEG encoder {backend}, use one of {tuple(ENCODERS)}")
+    return ENCODERS[backend](**options)
+
+
+def default_encoder() -> Encoder:
+    return _default
+
+
+def set_default_encoder(encoder: Encoder) -> None:
+    global _default
+    _default = encoder
+    logging.info(f"JPEG encoder: {encoder.describe()}")
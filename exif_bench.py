@@ -0,0 +1,73 @@
+"""Micro-benchmark of georeferenced JPEG saving.
+
+Compares the legacy path (cv2.imwrite, reopen with PIL, save again with EXIF)
+with the single-pass writer (encode once, splice EXIF APP1 segment in memory).
+
+Usage:
+  python exif_bench.py -n 50
+"""
+import argparse
+import glob
+import os
+import tempfile
+import time
+import cv2
+import numpy as np
+import piexif
+from PIL import Image
+
+from exif_utils import build_exif_bytes, save_frame_with_gps
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+GEO = dict(lat=50.0647, lng=19.945, alt=250.0, rel_alt=40.0, yaw=0.7)
+
+
+def legacy_save_frame_with_gps(frame, filename, lat, lng, alt=0.0, rel_alt=None, yaw=None):
+    """Previous implementation: JPEG encoded twice and decoded once."""
+    cv2.imwrite(filename, frame)
+    img = Image.open(filename)
+    exif_bytes = build_exif_bytes(lat, lng, alt=alt, rel_alt=rel_alt, yaw=yaw)
+    img.save(filename, "jpeg", exif=exif_bytes)
+
+
+def load_test_frame(width, height, samples_dir):
+    samples = sorted(glob.glob(os.path.join(samples_dir, "*.jpg")))
+    if samples:
+        frame = cv2.imread(samples[0])
+        return cv2.resize(frame, (width, height), interpolation=cv2.INTER_LINEAR)
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+
+def bench(save_fn, frame, out_dir, n):
+    path = os.path.join(out_dir, "bench.jpg")
+    save_fn(frame, path, **GEO)  # warm up
+    start = time.perf_counter()
+    for _ in range(n):
+        save_fn(frame, path, **GEO)
+    elapsed = time.perf_counter() - start
+    exif = piexif.load(path)
+    assert exif["GPS"][piexif.GPSIFD.GPSLatitudeRef] == b"N"
+    return n / elapsed, os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Georeferenced JPEG saving benchmark")
+    parser.add_argument("-n", type=int, default=50, help="Frames per measurement")
+    parser.add_argument("--samples", default="map_visualization/samples", help="Folder with sample JPEGs")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as td:
+        for res_name, (w, h) in RESOLUTIONS.items():
+            frame = load_test_frame(w, h, args.samples)
+            legacy_fps, legacy_size = bench(legacy_save_frame_with_gps, frame, td, args.n)
+            single_fps, single_size = bench(save_frame_with_gps, frame, td, args.n)
+            print(
+                f"{res_name}: legacy {legacy_fps:7.1f} fps ({legacy_size / 1024:.0f} KiB), "
+                f"single-pass {single_fps:7.1f} fps ({single_size / 1024:.0f} KiB), "
+                f"speedup x{single_fps / legacy_fps:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
-import cv2
-from PIL import Image
+import os
+import struct
 import piexif
 from datetime import datetime
 import math
 
+from encoders import Encoder, default_encoder
+
+
+JPEG_SOI = b"\xff\xd8"
+APP1_MARKER = b"\xff\xe1"
+
 
 def deg_to_dms_rational(deg):
     """Convert decimal coordinates into EXIF rational format (DMS)."""
@@ -12,10 +18,8 @@ def deg_to_dms_rational(deg):
     s = round((deg - d - m / 60) * 3600 * 100)
     return ((d, 1), (m, 1), (s, 100))
 
-def save_frame_with_gps(frame, filename, lat, lng, alt=0.0, rel_alt=None, yaw=None):
-    cv2.imwrite(filename, frame)
-    img = Image.open(filename)
-
+def build_exif_bytes(lat, lng, alt=0.0, rel_alt=None, yaw=None):
+    """Build EXIF payload with GPS position, altitude and yaw."""
     exif_dict = {"0th": {}, "Exif": {}, "GPS": {}, "1st": {}, "thumbnail": None}
 
     exif_dict["GPS"][piexif.GPSIFD.GPSLatitudeRef] = "N" if lat >= 0 else "S"
@@ -53,5 +57,49 @@ def save_frame_with_gps(frame, filename, lat, lng, alt=0.0, rel_alt=None, yaw=No
     exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = now_str
     exif_dict["Exif"][piexif.ExifIFD.DateTimeDigitized] = now_str
 
-    exif_bytes = piexif.dump(exif_dict)
-    img.save(filename, "jpeg", exif=exif_bytes)
+    return piexif.dump(exif_dict)
+
+def jpeg_payload_offset(jpg_buffer):
+    """Return offset of the first segment after SOI and any leading APP0/APP1 segments.
+
+    Encoders put a JFIF (APP0) header right after SOI, EXIF (APP1) has to replace it.
+    """
+    buf = memoryview(jpg_buffer)
+    if bytes(buf[0:2]) != JPEG_SOI:
+        raise ValueError("Given buffer is not a JPEG")
+    pos = 2
+    while pos + 4 <= len(buf) and buf[pos] == 0xFF and buf[pos + 1] in (0xE0, 0xE1):
+        (seg_len,) = struct.unpack(">H", buf[pos + 2 : pos + 4])
+        pos += 2 + seg_len
+    return pos
+
+def write_jpeg_with_exif(jpg_buffer, filename, exif_bytes):
+    """Write an already encoded JPEG with EXIF segment spliced in, without re-encoding.
+
+    The file is written with a single (vectored) write call.
+    """
+    app1_header = APP1_MARKER + struct.pack(">H", len(exif_bytes) + 2)
+    payload = memoryview(jpg_buffer)[jpeg_payload_offset(jpg_buffer):]
+    parts = [JPEG_SOI, app1_header, exif_bytes, payload]
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        total = sum(len(p) for p in parts)
+        written = os.writev(fd, parts) if hasattr(os, "writev") else 0
+        if written < total:
+            # short write (or no writev), write the remainder in plain chunks
+            remaining = memoryview(b"".join(parts))[written:]
+            while remaining:
+                remaining = remaining[os.write(fd, remaining):]
+    finally:
+        os.close(fd)
+
+def write_jpeg_with_gps(jpg_buffer, filename, lat, lng, alt=0.0, rel_alt=None, yaw=None):
+    exif_bytes = build_exif_bytes(lat, lng, alt=alt, rel_alt=rel_alt, yaw=yaw)
+    write_jpeg_with_exif(jpg_buffer, filename, exif_bytes)
+
+def save_frame_with_gps(
+    frame, filename, lat, lng, alt=0.0, rel_alt=None, yaw=None, quality=95, encoder: Encoder = None
+):
+    """Encode BGR frame once (default encoder unless given) and write it with EXIF GPS data."""
+    jpg_buffer = (encoder or default_encoder()).encode(frame, quality)
+    write_jpeg_with_gps(jpg_buffer, filename, lat, lng, alt=alt, rel_alt=rel_alt, yaw=yaw)
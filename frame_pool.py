@@ -0,0 +1,56 @@
+import collections
+import logging
+import threading
+import numpy as np
+
+
+class FramePool:
+    """Fixed ring of pre-allocated frame buffers handed out by slot index.
+
+    Every holder of a slot (capture loop, saver, sender) owns one reference, the
+    slot goes back to the pool when the last reference is released.
+    """
+
+    def __init__(self, size: int, shape: tuple, dtype=np.uint8):
+        logging.info(f"FramePool initialized with {size} buffers of shape {shape}")
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.buffers = [np.empty(shape, dtype=dtype) for _ in range(size)]
+        self.refcounts = [0] * size
+        self.free_slots = collections.deque(range(size))
+        self.lock = threading.Lock()
+        self.misses = 0
+
+    def acquire(self):
+        """Take a free slot with one reference, None if the pool is exhausted."""
+        with self.lock:
+            if not self.free_slots:
+                self.misses += 1
+                return None
+            slot = self.free_slots.popleft()
+            self.refcounts[slot] = 1
+            return slot
+
+    def retain(self, slot: int, count: int = 1) -> None:
+        with self.lock:
+            if self.refcounts[slot] <= 0:
+                raise ValueError(f"Slot {slot} is not in use")
+            self.refcounts[slot] += count
+
+    def release(self, slot: int) -> None:
+        with self.lock:
+            if self.refcounts[slot] <= 0:
+                raise ValueError(f"Slot {slot} released more times than retained")
+            self.refcounts[slot] -= 1
+            if self.refcounts[slot] == 0:
+                self.free_slots.append(slot)
+
+    def buffer(self, slot: int) -> np.ndarray:
+        return self.buffers[slot]
+
+    def matches(self, frame: np.ndarray) -> bool:
+        return frame.shape == self.shape and frame.dtype == self.dtype
+
+    def available(self) -> int:
+        with self.lock:
+            return len(self.free_slots)
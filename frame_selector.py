@@ -1,51 +1,262 @@
+import collections
 import threading
 import queue
 import numpy as np
 import logging
+import time
+import cv2
 from image_sender import ImgSender
 from models import DroneData
-from geo_frame import GeorefFrame
+from geo_frame import GeorefFrame, encode_stats
+from frame_pool import FramePool
+from image_quality import quality_scores
+from spatial_index import FootprintIndex, polygon_area
+
+SAVE_OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+SELECT_MODES = ("nth", "coverage")
 
 
 class FrameSelector:
-    def __init__(self, dir: str, send_ip: str, nth: int = 10, on_request=False):
+    def __init__(
+        self,
+        dir: str,
+        send_ip: str,
+        nth: int = 10,
+        on_request=False,
+        save_quality: int = None,
+        send_quality: int = 80,
+        save_workers: int = 1,
+        save_queue_size: int = 30,
+        save_overflow: str = "drop_oldest",
+        sender_options: dict = None,
+        mode: str = "nth",
+        coverage_overlap: float = 0.7,
+        coverage_history: int = 30,
+        coverage_min_alt: float = 2.0,
+        fov_x: float = 1.74,
+        quality_window: int = 1,
+        preview_interval: float = 0.0,
+        preview_width: int = 320,
+    ):
         logging.info(
-            f"FrameSelector initialized with nth_frame={nth}, on_request={on_request}"
+            f"FrameSelector initialized with mode={mode}, nth_frame={nth}, coverage_overlap={coverage_overlap}, "
+            f"coverage_history={coverage_history}, coverage_min_alt={coverage_min_alt}, "
+            f"quality_window={quality_window}, preview_interval={preview_interval}, "
+            f"on_request={on_request}, save_quality={save_quality}, send_quality={send_quality}, "
+            f"save_workers={save_workers}, save_queue_size={save_queue_size}, save_overflow={save_overflow}"
         )
+        if save_overflow not in SAVE_OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown save_overflow policy {save_overflow}, use one of {SAVE_OVERFLOW_POLICIES}"
+            )
+        if mode not in SELECT_MODES:
+            raise ValueError(f"Unknown select mode {mode}, use one of {SELECT_MODES}")
         # on_request - if True, frames are selected on external request, otherwise every nth frame is saved
+        # or, in coverage mode, a frame whose footprint no recently selected one covers by coverage_overlap
+        self.mode = mode
         self.nth_frame: int = nth
+        self.coverage_overlap = coverage_overlap
+        # footprints of the last coverage_history frames selected in coverage mode
+        self.coverage_history = max(1, coverage_history)
+        self.footprints = FootprintIndex(fov_x=fov_x)
+        self.selected_footprints = collections.deque()
+        # frames taken below this relative altitude (e.g. on the pad) map nothing in coverage mode
+        self.coverage_min_alt = coverage_min_alt
+        self.decision_time = 0.0
+        # automatic selections take the sharpest of quality_window frames starting at the selection point
+        self.quality_window = max(1, quality_window)
+        self.window_left = 0
+        self.candidate: GeorefFrame = None
+        self.scoring_time = 0.0
+        self.scored_count = 0
+        # live preview thumbnails sent every preview_interval seconds, 0 - off
+        self.preview_interval = preview_interval
+        self.preview_width = preview_width
+        self.last_preview = 0.0
         self.frame_count: int = 0
         self.dir = dir
         self.on_request = on_request
-        self.img_sender = ImgSender(address=f"tcp://{send_ip}:5001", jpeg_quality=80)
-        self.to_save_queue = queue.Queue()
-        self.saving_thread = threading.Thread(target=self.__saving_worker)
-        self.saving_thread.start()
+        # archived at the send quality by default, with equal qualities the saver and the sender share a single encode
+        self.save_quality = save_quality if save_quality is not None else send_quality
+        self.img_sender = ImgSender(
+            address=f"tcp://{send_ip}:5001",
+            jpeg_quality=send_quality,
+            fov_x=fov_x,
+            **(sender_options or {}),
+        )
+        # bounded, each queued frame holds a full resolution image
+        self.to_save_queue = queue.Queue(maxsize=save_queue_size)
+        self.save_overflow = save_overflow
+        self.stats_lock = threading.Lock()
+        self.saved_count = 0
+        self.dropped_count = 0
+        self.max_queue_depth = 0
+        self.saving_threads = [
+            threading.Thread(target=self.__saving_worker, name=f"saver-{i}")
+            for i in range(save_workers)
+        ]
+        for thread in self.saving_threads:
+            thread.start()
         self.save_next_frame = False
 
-    def take_frame(self, frame: np.ndarray, drone_data: DroneData) -> None:
+    def take_frame(
+        self,
+        frame: np.ndarray,
+        drone_data: DroneData,
+        pool: FramePool = None,
+        slot: int = None,
+    ) -> None:
+        if self.preview_interval and time.monotonic() - self.last_preview >= self.preview_interval:
+            self.__send_preview(frame, drone_data)
         if drone_data is not None:
-            if (
-                not self.on_request and self.frame_count % self.nth_frame == 0
-            ) or self.save_next_frame:
-                geo_frame = GeorefFrame(
-                    frame.copy(), drone_data, name=f"frame_{self.frame_count}"
-                )
-                self.to_save_queue.put(geo_frame)
-                self.img_sender.add_frame_to_send(geo_frame)
-                logging.debug(
-                    f"Queued frame {geo_frame.name} for saving with geodata: lat={drone_data.lat}, lon={drone_data.lon}, alt={drone_data.alt}, rel_alt={drone_data.rel_alt}"
-                )
+            if self.save_next_frame:
+                # requested frames are taken as they are
+                geo_frame = self.__hold(frame, drone_data, pool, slot)
+                geo_frame.quality = self.__score(frame)
+                self.__emit(geo_frame, lane="trigger")
                 self.save_next_frame = False
+            elif not self.on_request:
+                if not self.window_left and self.__is_selected(frame, drone_data):
+                    self.window_left = self.quality_window
+                if self.window_left:
+                    self.__consider(frame, drone_data, pool, slot)
         self.frame_count += 1
 
+    def __hold(self, frame, drone_data, pool, slot) -> GeorefFrame:
+        name = f"frame_{self.frame_count}"
+        if pool is not None and slot is not None:
+            pool.retain(slot)
+            return GeorefFrame(frame, drone_data, name, pool=pool, slot=slot, timestamp=time.time())
+        return GeorefFrame(frame.copy(), drone_data, name, timestamp=time.time())
+
+    def __score(self, frame: np.ndarray) -> dict:
+        start = time.perf_counter()
+        scores = quality_scores(frame)
+        self.scoring_time += time.perf_counter() - start
+        self.scored_count += 1
+        return scores
+
+    def __consider(self, frame, drone_data, pool, slot) -> None:
+        scores = self.__score(frame)
+        if self.candidate is None or scores["score"] > self.candidate.quality["score"]:
+            if self.candidate is not None:
+                self.candidate.release()
+            self.candidate = self.__hold(frame, drone_data, pool, slot)
+            self.candidate.quality = scores
+        self.window_left -= 1
+        if not self.window_left:
+            candidate, self.candidate = self.candidate, None
+            self.__emit(candidate)
+
+    def __send_preview(self, frame: np.ndarray, drone_data: DroneData) -> None:
+        self.last_preview = time.monotonic()
+        h, w = frame.shape[:2]
+        thumbnail = cv2.resize(
+            frame, (self.preview_width, round(h * self.preview_width / w)), interpolation=cv2.INTER_AREA
+        )
+        geo_frame = GeorefFrame(
+            thumbnail, drone_data or DroneData(), f"preview_{self.frame_count}", timestamp=time.time()
+        )
+        self.img_sender.add_frame_to_send(geo_frame, lane="preview")
+
+    def __emit(self, geo_frame: GeorefFrame, lane: str = "periodic") -> None:
+        # the held reference goes to the saver, one more for the sender
+        if geo_frame.pool is not None:
+            geo_frame.pool.retain(geo_frame.slot)
+        if self.mode == "coverage":
+            image = geo_frame.image
+            footprint = self.footprints.footprint(geo_frame.drone_data, image.shape[1], image.shape[0])
+            if footprint is not None:
+                self.footprints.insert(geo_frame.name, footprint)
+                self.selected_footprints.append(geo_frame.name)
+                while len(self.selected_footprints) > self.coverage_history:
+                    self.footprints.remove(self.selected_footprints.popleft())
+        self.__queue_for_saving(geo_frame)
+        self.img_sender.add_frame_to_send(geo_frame, lane)
+        drone_data = geo_frame.drone_data
+        logging.debug(
+            f"Queued frame {geo_frame.name} for saving with geodata: lat={drone_data.lat}, lon={drone_data.lon}, alt={drone_data.alt}, rel_alt={drone_data.rel_alt}, quality={geo_frame.quality}"
+        )
+
+    def __is_selected(self, frame: np.ndarray, drone_data: DroneData) -> bool:
+        if self.mode == "nth":
+            return self.frame_count % self.nth_frame == 0
+        start = time.perf_counter()
+        try:
+            if not drone_data.is_initialized() or (drone_data.rel_alt or 0.0) <= self.coverage_min_alt:
+                return False
+            footprint = self.footprints.footprint(drone_data, frame.shape[1], frame.shape[0])
+            if footprint is None or polygon_area(footprint) < 1.0:
+                # looking at the horizon or at the ground right below, nothing to map
+                return False
+            # ground already covered by a recent selection, also when flying back over it
+            return self.footprints.overlap_ratio(footprint) < self.coverage_overlap
+        finally:
+            self.decision_time += time.perf_counter() - start
+
+    def __queue_for_saving(self, geo_frame: GeorefFrame) -> None:
+        if self.save_overflow == "block":
+            self.to_save_queue.put(geo_frame)
+        elif self.save_overflow == "drop_newest":
+            try:
+                self.to_save_queue.put_nowait(geo_frame)
+            except queue.Full:
+                self.__count_drop(geo_frame)
+                geo_frame.release()
+        else:
+            while True:
+                try:
+                    self.to_save_queue.put_nowait(geo_frame)
+                    break
+                except queue.Full:
+                    pass
+                try:
+                    oldest = self.to_save_queue.get_nowait()
+                except queue.Empty:
+                    continue
+                self.to_save_queue.task_done()
+                self.__count_drop(oldest)
+                oldest.release()
+        depth = self.to_save_queue.qsize()
+        with self.stats_lock:
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+
+    def __count_drop(self, geo_frame: GeorefFrame) -> None:
+        with self.stats_lock:
+            self.dropped_count += 1
+            dropped = self.dropped_count
+        logging.warning(
+            f"Saving queue is full ({self.save_overflow}), dropped frame {geo_frame.name}, "
+            f"dropped so far: {dropped}"
+        )
+
+    def saving_stats(self) -> dict:
+        with self.stats_lock:
+            return {
+                "frames": self.frame_count,
+                "select_ms_per_frame": round(1000 * self.decision_time / max(self.frame_count, 1), 3),
+                "score_ms_per_frame": round(1000 * self.scoring_time / max(self.scored_count, 1), 3),
+                "queue_depth": self.to_save_queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "saved": self.saved_count,
+                "dropped": self.dropped_count,
+            }
+
     def __saving_worker(self):
         while True:
             item: GeorefFrame = self.to_save_queue.get()
             if item is None:
+                self.to_save_queue.task_done()
                 break
-            item.save(self.dir)
-            self.to_save_queue.task_done()
+            try:
+                item.save(self.dir, quality=self.save_quality)
+                with self.stats_lock:
+                    self.saved_count += 1
+            except Exception as ex:
+                logging.warning(f"Saving frame {item.name} failed:", exc_info=ex)
+            finally:
+                item.release()
+                self.to_save_queue.task_done()
 
     def request_saving(self):
         if self.on_request:
@@ -53,6 +264,13 @@ class FrameSelector:
             self.save_next_frame = True
 
     def finish_saving(self):
-        self.to_save_queue.put(None)
+        if self.candidate is not None:
+            candidate, self.candidate = self.candidate, None
+            self.__emit(candidate)
+        for _ in self.saving_threads:
+            self.to_save_queue.put(None)
         self.img_sender.stop()
-        self.saving_thread.join()
+        for thread in self.saving_threads:
+            thread.join()
+        logging.info(f"Saving stats: {self.saving_stats()}")
+        encode_stats.log_summary()
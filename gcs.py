@@ -1,33 +1,178 @@
 import cv2
-import imagezmq
 import simplejpeg
-import json
 import os
 import logging
 import argparse
+import threading
+import time
 from datetime import datetime
 from geo_frame import GeorefFrame
+from map_visualization.mosaic import Mosaic
+from pipeline import Stage, StageStats
+from tiling import reassemble
+from transport import FrameTransportReceiver, TRANSPORT_MODES
+from wire_format import pack_header, unpack_header
+
+
+def load_tiled_frame(header_path: str) -> GeorefFrame:
+    """Tiled frame saved by the GCS (header and atlas JPEG) with its BGRA frame image."""
+    with open(header_path, "rb") as f:
+        header = f.read()
+    with open(os.path.splitext(header_path)[0] + ".jpg", "rb") as f:
+        jpg_buffer = f.read()
+    frame = unpack_header(header, jpg_buffer)
+    atlas = simplejpeg.decode_jpeg(jpg_buffer, colorspace="BGR")
+    frame.image = reassemble(atlas, frame.tiles, frame.encoding["width"], frame.encoding["height"])
+    return frame
 
 
 class GCS:
-    def __init__(self):
+    def __init__(
+        self,
+        transport="dealer",
+        save_workers=2,
+        decode_workers=1,
+        show=True,
+        live_map=False,
+        fov_x=1.74,
+        stats_interval=30,
+    ):
+        self.transport = transport
+        self.show = show
+        self.stats_interval = stats_interval
+        self.running = False
         self.output_dir = datetime.now().strftime("data/gcs_%Y-%m-%d_%H-%M-%S")
         os.makedirs(self.output_dir, exist_ok=True)
+        # tiled frames are kept apart, they are not whole georeferenced frames
+        self.tiles_dir = os.path.join(self.output_dir, "tiles")
+        # received JPEGs are archived as they are, decoding is only needed for consumers of the image
+        self.save_stage = Stage("save", self.save_frame, 200, workers=save_workers)
+        self.decode_stage = Stage("decode", self.decode_frame, 10, workers=decode_workers)
+        self.display_stage = Stage("display", self.show_frame, 2, threaded=False)
+        # mosaic is updated from a single thread, straight from decoded frames
+        self.mosaic = Mosaic(fov_x=fov_x) if live_map else None
+        self.map_stage = Stage("map", self.map_frame, 30)
+        self.receive_stats = StageStats("receive")
 
-    def run(self):
-        image_hub = imagezmq.ImageHub(open_port="tcp://*:5001")
-        while True:
-            meta_str, jpg_buffer = image_hub.recv_jpg()
-            image = simplejpeg.decode_jpeg(jpg_buffer, colorspace="BGR")
-            meta_dict = json.loads(meta_str)
+    def receive_loop(self):
+        receiver = None
+        last_stats_log = time.monotonic()
+        try:
+            receiver = FrameTransportReceiver(open_port="tcp://*:5001", mode=self.transport)
+            while self.running:
+                item = receiver.recv(timeout=0.5)
+                if item is None:
+                    continue
+                start = time.perf_counter()
+                # reply right away, the frame is handled by the workers
+                receiver.ack()
+                header, jpg_buffer = item
+                try:
+                    frame = unpack_header(header, jpg_buffer)
+                except ValueError as ex:
+                    logging.warning(f"Dropping frame with bad header: {ex}")
+                    continue
+                logging.info(f"{frame.name}: {frame.drone_data}, quality: {frame.quality}, encoding: {frame.encoding}")
+                # live preview thumbnails are only displayed
+                preview = frame.lane == "preview"
+                if not preview:
+                    self.save_stage.put(frame, block=True)
+                if self.mosaic and not preview:
+                    # map frames are never dropped, a slow map holds up receiving like saving does
+                    self.decode_stage.put(frame, block=True)
+                elif self.show and not self.decode_stage.put(frame):
+                    logging.warning(f"Decoding is behind, {frame.name} not displayed.")
+                self.receive_stats.record(time.perf_counter() - start)
+
+                if time.monotonic() - last_stats_log > self.stats_interval:
+                    last_stats_log = time.monotonic()
+                    self.log_stats()
+        except Exception as ex:
+            logging.error("Receiving failed, stopping GCS:", exc_info=ex)
+        finally:
+            # also when receiving failed, so the main thread does not wait for frames forever
+            self.running = False
+            if receiver is not None:
+                receiver.close()
+            self.decode_stage.stop()
+            self.save_stage.stop()
+            self.decode_stage.join()
+            if self.mosaic:
+                self.map_stage.stop()
+            # decoding has stopped, nothing else is put on the display stage
+            self.display_stage.stop()
+
+    def save_frame(self, frame: GeorefFrame):
+        if frame.tiles:
+            # the tiles are the only copy of their ground on the GCS, load_tiled_frame rebuilds the frame
+            os.makedirs(self.tiles_dir, exist_ok=True)
+            path = os.path.join(self.tiles_dir, frame.name)
+            with open(f"{path}.hdr", "wb") as f:
+                f.write(pack_header(frame, frame.frame_id))
+            with open(f"{path}.jpg", "wb") as f:
+                f.write(frame.jpg_buffer)
+            return
+        frame.save(dir_path=self.output_dir)
+
+    def decode_frame(self, frame: GeorefFrame):
+        frame.image = simplejpeg.decode_jpeg(frame.jpg_buffer, colorspace="BGR")
+        if frame.tiles:
+            # back to frame layout, tiles not sent are transparent and skipped by the mosaic
+            frame.image = reassemble(frame.image, frame.tiles, frame.encoding["width"], frame.encoding["height"])
+        if self.mosaic and frame.lane != "preview":
+            self.map_stage.put(frame, block=True)
+        if self.show:
+            self.display_stage.put(frame)
 
-            frame = GeorefFrame.from_dict(image, meta_dict)
-            logging.info(f"{frame.name}: {frame.drone_data}")
+    def map_frame(self, frame: GeorefFrame):
+        data = frame.drone_data
+        tiles = self.mosaic.add_frame(
+            frame.image, data.lat, data.lon, data.rel_alt, data.yaw, data.roll, data.pitch
+        )
+        logging.debug(f"{frame.name} added to the map, {len(tiles)} tiles updated.")
 
-            frame.save(dir_path=self.output_dir)
-            cv2.imshow("frame", frame.image)
-            cv2.waitKey(1)
-            image_hub.send_reply(b"OK")
+    def show_frame(self, frame: GeorefFrame):
+        cv2.imshow("frame", frame.image)
+        cv2.waitKey(1)
+
+    def log_stats(self):
+        for stats in (
+            self.receive_stats,
+            self.save_stage.stats,
+            self.decode_stage.stats,
+            self.map_stage.stats,
+            self.display_stage.stats,
+        ):
+            logging.info(stats.summary())
+
+    def run(self):
+        self.running = True
+        self.save_stage.start()
+        self.decode_stage.start()
+        if self.mosaic:
+            self.map_stage.start()
+        receive_thread = threading.Thread(target=self.receive_loop, name="receive")
+        receive_thread.start()
+        try:
+            # display stays on the main thread
+            while self.running:
+                self.display_stage.run()
+        except KeyboardInterrupt:
+            logging.info("KeyboardInterrupt received, stopping GCS.")
+            self.running = False
+            # keep the display stage going until the receive thread ends it, a full queue would block it
+            self.display_stage.run()
+        finally:
+            self.running = False
+            receive_thread.join()
+            self.save_stage.join()
+            if self.mosaic:
+                self.map_stage.join()
+            self.log_stats()
+            if self.mosaic and len(self.mosaic.store):
+                map_path = os.path.join(self.output_dir, "orthomap.png")
+                self.mosaic.save(map_path)
+                logging.info(f"Map saved to {map_path}")
 
 
 if __name__ == "__main__":
@@ -39,10 +184,39 @@ if __name__ == "__main__":
         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
         help="Set the logging level (default: INFO)",
     )
+    parser.add_argument(
+        "-t",
+        "--transport",
+        default="dealer",
+        choices=TRANSPORT_MODES,
+        help="Transport mode, has to match sender: transport: in the config (default: dealer)",
+    )
+    parser.add_argument(
+        "--save-workers", type=int, default=2, help="Number of frame saving threads (default: 2)"
+    )
+    parser.add_argument(
+        "--decode-workers", type=int, default=1, help="Number of JPEG decoding threads (default: 1)"
+    )
+    parser.add_argument(
+        "--no-show", action="store_true", help="Do not display received frames"
+    )
+    parser.add_argument(
+        "-m", "--map", action="store_true", help="Build orthomosaic from received frames live"
+    )
+    parser.add_argument(
+        "--fov-x", type=float, default=1.74, help="Camera horizontal field of view in radians (default: 1.74)"
+    )
     args = parser.parse_args()
     logging.basicConfig(
         level=getattr(logging, args.log_level.upper()),
         format="%(asctime)s %(levelname)s: %(message)s",
     )
-    gcs = GCS()
+    gcs = GCS(
+        transport=args.transport,
+        save_workers=args.save_workers,
+        decode_workers=args.decode_workers,
+        show=not args.no_show,
+        live_map=args.map,
+        fov_x=args.fov_x,
+    )
     gcs.run()
@@ -1,28 +1,116 @@
+import cv2
 import numpy as np
 import os
+import threading
+import time
+import logging
+from encoders import default_encoder
 from models import DroneData
-from exif_utils import save_frame_with_gps
+from exif_utils import write_jpeg_with_gps
+from frame_pool import FramePool
+
+
+class EncodeStats:
+    """Session counters of JPEG encodes shared between frame consumers."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.encodes = 0
+        self.reuses = 0
+        self.encode_time = 0.0
+        self.time_saved = 0.0
+
+    def add_encode(self, duration: float) -> None:
+        with self.lock:
+            self.encodes += 1
+            self.encode_time += duration
+
+    def add_reuse(self, duration: float) -> None:
+        with self.lock:
+            self.reuses += 1
+            self.time_saved += duration
+
+    def log_summary(self) -> None:
+        with self.lock:
+            logging.info(
+                f"JPEG encodes: {self.encodes} ({self.encode_time:.2f}s), "
+                f"reused: {self.reuses}, encode time saved: {self.time_saved:.2f}s"
+            )
+
+
+encode_stats = EncodeStats()
 
 
 class GeorefFrame:
-    def __init__(self, image: np.ndarray, drone_data: DroneData, name: str):
+    def __init__(
+        self,
+        image: np.ndarray,
+        drone_data: DroneData,
+        name: str,
+        pool: FramePool = None,
+        slot: int = None,
+        jpg_buffer: bytes = None,
+        quality: dict = None,
+        encoding: dict = None,
+        lane: str = None,
+        timestamp: float = None,
+        frame_id: int = None,
+        tiles: dict = None,
+    ):
         self.image: np.ndarray = image
         self.drone_data: DroneData = drone_data
         self.name: str = name
+        # image is a FramePool buffer when slot is set, consumers release it when done
+        self.pool: FramePool = pool
+        self.slot: int = slot
+        # JPEG as received from the sender, saved as is without re-encoding
+        self.jpg_buffer = jpg_buffer
+        # image quality scores (image_quality.quality_scores), sent with the metadata
+        self.quality: dict = quality
+        # JPEG quality and size the frame was sent with, filled in by ImgSender
+        self.encoding: dict = encoding
+        # send_queue lane the frame was sent in
+        self.lane: str = lane
+        # capture time (unix seconds) and sender sequence number, see wire_format
+        self.timestamp: float = timestamp
+        self.frame_id: int = frame_id
+        # tile grid and mask when the JPEG holds only some tiles of the frame, see tiling
+        self.tiles: dict = tiles
+        # encoded JPEG payloads by quality, shared by the saver and the sender
+        self._jpeg_cache: dict = {}
+        self._jpeg_lock = threading.Lock()
+
+    def release(self) -> None:
+        """Drop one consumer reference to the pooled image buffer."""
+        if self.pool is not None and self.slot is not None:
+            self.pool.release(self.slot)
 
-    @classmethod
-    def from_dict(cls, image, meta_dict):
-        img_name = meta_dict.get("name")
-        del meta_dict["name"]
-        drone_data = DroneData(**meta_dict)
-        return cls(image=image, drone_data=drone_data, name=img_name)
+    def jpeg(self, quality: int, scale: float = 1.0) -> bytes:
+        """Return JPEG payload for given quality and scale, encoding it only on first use."""
+        with self._jpeg_lock:
+            cached = self._jpeg_cache.get((quality, scale))
+            if cached is not None:
+                jpg_buffer, duration = cached
+                encode_stats.add_reuse(duration)
+                return jpg_buffer
+            start = time.perf_counter()
+            image = self.image
+            if scale != 1.0:
+                size = (round(image.shape[1] * scale), round(image.shape[0] * scale))
+                image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+            jpg_buffer = default_encoder().encode(image, quality)
+            duration = time.perf_counter() - start
+            self._jpeg_cache[(quality, scale)] = (jpg_buffer, duration)
+        encode_stats.add_encode(duration)
+        return jpg_buffer
 
-    def save(self, dir_path=None) -> None:
+    def save(self, dir_path=None, quality: int = 80) -> None:
         path = self.name
         if dir_path is not None:
             path = os.path.join(dir_path, self.name)
-        save_frame_with_gps(
-            self.image,
+        jpg_buffer = self.jpg_buffer if self.jpg_buffer is not None else self.jpeg(quality)
+        write_jpeg_with_gps(
+            jpg_buffer,
             f"{path}.jpg",
             lat=self.drone_data.lat,
             lng=self.drone_data.lon,
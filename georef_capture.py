@@ -1,20 +1,36 @@
 import cv2
+import numpy as np
 import threading
 from pymavlink import mavutil
 import argparse
 import os
 import datetime
 import yaml
-import copy
 import dataclasses
+import time
+from encoders import create_encoder, set_default_encoder
 from frame_selector import FrameSelector
 from models import DroneData
+from frame_pool import FramePool
+from pipeline import Stage, StageStats
+from telemetry import TelemetryBuffer
+from telemetry_log import TelemetryLogWriter, export_yaml
 import logging
 
 
 STREAM_PIPELINE = " out. ! queue ! rtph264pay config-interval=1 pt=96 ! udpsink host={address} port={port} sync=false async=false"
 
 
+@dataclasses.dataclass
+class CapturedFrame:
+    frame: np.ndarray
+    slot: int = None
+    timestamp: float = None
+    index: int = None
+    drone_data: DroneData = None
+    recorded: bool = False
+
+
 class Capturer:
     def __init__(self, args):
         with open(args.config, "r") as f:
@@ -24,24 +40,50 @@ class Capturer:
         self.preview = args.preview
         self.no_tele = args.no_tele
         self.stream_ip = args.stream_ip
-        self.last_drone_data = None
-        self.telems = []
+        self.telemetry = TelemetryBuffer(self.config.get("telemetry_buffer_size", 2048))
+        # delay between exposure and cap.read() returning the frame
+        self.camera_latency = self.config.get("camera_latency", 0.0)
+        # JPEG encoder of saved and sent frames
+        set_default_encoder(create_encoder(**(self.config.get("encoder") or {})))
+        self.telemetry_log = None
         self.cap = None
         self.writer = None
+        self.frame_pool = None
         self.mav_listener = None
         self.running = False
+        self.capturing = False
+        self.frames_num = 0
 
         self.output_dir = datetime.datetime.now().strftime("data/%Y-%m-%d_%H-%M-%S")
         os.makedirs(self.output_dir, exist_ok=True)
         base = os.path.basename("out.mp4")
         self.video_filename = os.path.join(self.output_dir, base)
+        if not self.no_tele:
+            self.telemetry_log = TelemetryLogWriter(
+                os.path.join(self.output_dir, "telemetry.bin"),
+                flush_interval=self.config.get("telemetry_flush_interval", 1.0),
+            )
         frames_dir = os.path.join(self.output_dir, "frames")
         os.makedirs(frames_dir, exist_ok=True)
         self.frame_selector = FrameSelector(
             frames_dir,
             self.config.get("gcs_ip"),
             self.config.get("select_nth_frame"),
-            self.config.get("select_on_request", False)
+            self.config.get("select_on_request", False),
+            save_quality=self.config.get("save_jpeg_quality"),
+            send_quality=self.config.get("send_jpeg_quality", 80),
+            save_workers=self.config.get("save_workers", 1),
+            save_queue_size=self.config.get("save_queue_size", 30),
+            save_overflow=self.config.get("save_overflow", "drop_oldest"),
+            sender_options=self.config.get("sender"),
+            mode=self.config.get("select_mode", "nth"),
+            coverage_overlap=self.config.get("coverage_overlap", 0.7),
+            coverage_history=self.config.get("coverage_history", 30),
+            coverage_min_alt=self.config.get("coverage_min_alt", 2.0),
+            fov_x=self.config.get("camera_fov_x", 1.74),
+            quality_window=self.config.get("quality_window", 1),
+            preview_interval=self.config.get("preview_interval", 0.0),
+            preview_width=self.config.get("preview_width", 320),
         )
 
     def run(self):
@@ -59,12 +101,14 @@ class Capturer:
     def finish(self):
         self.running = False
         self.frame_selector.finish_saving()
-        if not self.no_tele:
-            logging.info(f"Captured {len(self.telems)} telemetry points.")
-            yaml_path = os.path.join(self.output_dir, "telemetry.yaml")
-            with open(yaml_path, "w") as f:
-                yaml.dump([dataclasses.asdict(t) for t in self.telems], f)
-            logging.info(f"Telemetry saved to {yaml_path}")
+        if self.telemetry_log:
+            self.telemetry_log.close()
+            logging.info(f"Captured {self.telemetry_log.count} telemetry points.")
+            logging.info(f"Telemetry saved to {self.telemetry_log.path}")
+            if self.config.get("export_telemetry_yaml", False):
+                yaml_path = os.path.join(self.output_dir, "telemetry.yaml")
+                export_yaml(self.telemetry_log.path, yaml_path)
+                logging.info(f"Telemetry exported to {yaml_path}")
 
     def mavlink_listener(self):
         logging.info("Mavlink listener started")
@@ -81,19 +125,22 @@ class Capturer:
             )
             if not msg:
                 continue
-            if self.last_drone_data is None:
-                self.last_drone_data = DroneData()
+            arrival_time = time.monotonic()
 
             if msg.get_type() == "GLOBAL_POSITION_INT":
-                self.last_drone_data.lat = msg.lat / 1e7
-                self.last_drone_data.lon = msg.lon / 1e7
-                self.last_drone_data.alt = msg.alt / 1000.0  # in meters
-                self.last_drone_data.rel_alt = msg.relative_alt / 1000.0
+                self.telemetry.add_position(
+                    msg.time_boot_ms,
+                    msg.lat / 1e7,
+                    msg.lon / 1e7,
+                    msg.alt / 1000.0,  # in meters
+                    msg.relative_alt / 1000.0,
+                    arrival_time=arrival_time,
+                )
 
             elif msg.get_type() == "ATTITUDE":
-                self.last_drone_data.roll = round(msg.roll, 5)
-                self.last_drone_data.pitch = round(msg.pitch, 5)
-                self.last_drone_data.yaw = round(msg.yaw, 5)
+                self.telemetry.add_attitude(
+                    msg.time_boot_ms, msg.roll, msg.pitch, msg.yaw, arrival_time=arrival_time
+                )
             elif msg.get_type() == "CAMERA_IMAGE_CAPTURED" or msg.get_type() == "CAMERA_TRIGGER":
                 logging.debug(f"Camera msg received {msg.get_type()}.")
                 self.frame_selector.request_saving()
@@ -106,6 +153,9 @@ class Capturer:
             return
 
         height, width = frame.shape[:2]
+        self.frame_pool = FramePool(
+            self.config.get("frame_pool_size", 32), frame.shape, frame.dtype
+        )
         gst_writer_pipeline = self.config.get("gst_writer_pipeline")
         gst_writer_pipeline = gst_writer_pipeline.format(
             output_file=self.video_filename
@@ -127,44 +177,141 @@ class Capturer:
             )
             self.writer = None
 
+    def read_frame(self):
+        """Read next frame into a pooled buffer, falls back to a fresh array when the pool is exhausted."""
+        slot = self.frame_pool.acquire() if self.frame_pool else None
+        if slot is None:
+            ret, frame = self.cap.read()
+            return ret, frame, None
+        buffer = self.frame_pool.buffer(slot)
+        ret, frame = self.cap.read(image=buffer)
+        if frame is not buffer:
+            # frame size changed, OpenCV allocated a new array
+            self.frame_pool.release(slot)
+            return ret, frame, None
+        return ret, frame, slot
+
+    def release_frame(self, captured: CapturedFrame) -> None:
+        if captured.slot is not None:
+            self.frame_pool.release(captured.slot)
+
+    def record_frame(self, captured: CapturedFrame) -> None:
+        try:
+            self.writer.write(captured.frame)
+            if self.telemetry_log:
+                self.telemetry_log.append(
+                    captured.index, captured.timestamp, captured.drone_data
+                )
+        finally:
+            self.release_frame(captured)
+
+    def select_frame(self, captured: CapturedFrame) -> None:
+        try:
+            if self.preview:
+                cv2.imshow("Frame", captured.frame)
+                if cv2.waitKey(1) == ord("q"):
+                    self.capturing = False
+            if captured.recorded:
+                self.frame_selector.take_frame(
+                    captured.frame, captured.drone_data, self.frame_pool, captured.slot
+                )
+        finally:
+            self.release_frame(captured)
+
+    def grab_loop(self, record_stage: Stage, select_stage: Stage) -> None:
+        grab_stats = StageStats("grab")
+        last_stats_log = time.monotonic()
+        try:
+            while self.capturing:
+                start = time.perf_counter()
+                ret, frame, slot = self.read_frame()
+                capture_time = time.monotonic() - self.camera_latency
+                grab_stats.record(time.perf_counter() - start)
+                if not ret:
+                    logging.error("Error: Could not read frame")
+                    if slot is not None:
+                        self.frame_pool.release(slot)
+                    break
+                captured = CapturedFrame(frame, slot, capture_time)
+                if self.writer:
+                    if not self.no_tele:
+                        captured.drone_data = self.telemetry.sample(capture_time)
+                    if captured.drone_data is not None or self.no_tele:
+                        captured.recorded = True
+                    else:
+                        logging.warning("Warning: No telem, skipping frame.")
+                # one reference per downstream stage, the grab reference is dropped below
+                if captured.recorded:
+                    if slot is not None:
+                        self.frame_pool.retain(slot)
+                    captured.index = self.frames_num
+                    if record_stage.put(captured):
+                        self.frames_num += 1
+                    else:
+                        logging.warning("Recording stage is behind, frame not written.")
+                if slot is not None:
+                    self.frame_pool.retain(slot)
+                select_stage.put(captured)
+                self.release_frame(captured)
+
+                if time.monotonic() - last_stats_log > self.config.get("stats_interval", 30):
+                    last_stats_log = time.monotonic()
+                    for stats in (grab_stats, record_stage.stats, select_stage.stats):
+                        logging.info(stats.summary())
+        finally:
+            self.capturing = False
+            record_stage.stop()
+            select_stage.stop()
+            logging.info(grab_stats.summary())
+
     def video_capture(self):
         self.cap = cv2.VideoCapture(
             self.config.get("gst_capture_pipeline"),
             cv2.CAP_GSTREAMER,
         )
         self.prepare_gst_writer()
-        frames_num = 0
+        self.frames_num = 0
         if not self.cap.isOpened():
             logging.error("Error: Unable to open camera")
             exit()
+        # grab and record run in threads, selection and preview stay on the main thread (cv2.imshow)
+        record_stage = Stage(
+            "record",
+            self.record_frame,
+            self.config.get("record_queue_size", 15),
+            on_drop=self.release_frame,
+        )
+        select_stage = Stage(
+            "select",
+            self.select_frame,
+            self.config.get("select_queue_size", 4),
+            on_drop=self.release_frame,
+            threaded=False,
+        )
+        self.capturing = True
+        grab_thread = threading.Thread(
+            target=self.grab_loop, args=(record_stage, select_stage), name="grab"
+        )
+        record_stage.start()
+        grab_thread.start()
         try:
-            while True:
-                ret, frame = self.cap.read()
-                if ret:
-                    if self.preview:
-                        cv2.imshow("Frame", frame)
-                    if self.writer:
-                        if (self.last_drone_data and self.last_drone_data.is_initialized()) or self.no_tele:
-                            self.telems.append(copy.deepcopy(self.last_drone_data))
-                            self.writer.write(frame)
-                            self.frame_selector.take_frame(frame, self.last_drone_data)
-                            frames_num += 1
-                        else:
-                            logging.warning("Warning: No telem, skipping frame.")
-                else:
-                    logging.error("Error: Could not read frame")
-                    break
-
-                if self.preview and cv2.waitKey(1) == ord("q"):
-                    break
+            select_stage.run()
         except KeyboardInterrupt:
             logging.info("\nKeyboardInterrupt received in video loop. Exiting...")
+            self.capturing = False
+            # drain until the grab thread queues the end marker
+            select_stage.run()
         finally:
+            grab_thread.join()
+            record_stage.join()
             self.cap.release()
             if self.writer:
                 self.writer.release()
-            logging.info(f"Total frames written: {frames_num}")
-
+            logging.info(record_stage.stats.summary())
+            logging.info(select_stage.stats.summary())
+            logging.info(f"Total frames written: {self.frames_num}")
+            if self.frame_pool:
+                logging.info(f"Frame pool misses: {self.frame_pool.misses}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Georeferenced video capture")
@@ -0,0 +1,36 @@
+"""Cheap sharpness and exposure scores of camera frames.
+
+Metrics are computed on a small grayscale copy of the frame, which keeps
+them in the millisecond range on the companion computer
+(`python quality_bench.py` measures it).
+"""
+import cv2
+import numpy as np
+
+SCORE_WIDTH = 320
+# gray levels treated as under/over exposed
+CLIP_LOW = 4
+CLIP_HIGH = 251
+
+
+def quality_scores(frame: np.ndarray, width: int = SCORE_WIDTH) -> dict:
+    """Sharpness (Laplacian variance), clipped pixel fraction and combined score of a BGR frame.
+
+    Higher score is better, sharpness depends on the scene so scores are only
+    comparable between neighbouring frames.
+    """
+    h, w = frame.shape[:2]
+    if w > width:
+        small = cv2.resize(frame, (width, round(h * width / w)), interpolation=cv2.INTER_AREA)
+    else:
+        small = frame
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+    sharpness = float(std[0, 0] ** 2)
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+    clipped = float((hist[:CLIP_LOW].sum() + hist[CLIP_HIGH:].sum()) / gray.size)
+    return {
+        "sharpness": round(sharpness, 1),
+        "clipped": round(clipped, 4),
+        "score": round(sharpness * (1 - clipped), 1),
+    }
@@ -1,14 +1,19 @@
-import dataclasses
+import itertools
+import queue
 import time
 import cv2
-import imagezmq
 import zmq
 from threading import Thread
 import logging
-import simplejpeg
-import queue
+from encoders import default_encoder
 from geo_frame import GeorefFrame
 from models import DroneData
+from rate_control import AdaptiveQuality
+from send_queue import PrioritySendQueue
+from spool import FrameSpool
+from tiling import TileSelector, pack_tiles
+from transport import FrameTransportSender
+from wire_format import pack_header
 
 
 class ImgSender:
@@ -17,55 +22,245 @@ class ImgSender:
         jpeg_quality=95,
         address="tcp://0.0.0.0:5001",
         max_queue_size=100,
+        transport="dealer",
+        max_in_flight=4,
+        send_hwm=10,
+        ack_timeout=5.0,
+        adaptive: dict = None,
+        zero_copy: bool = True,
+        spool: dict = None,
+        tiling: dict = None,
+        fov_x: float = 1.74,
     ):
-        logging.info(f"Starting ImgSender to {address}")
+        logging.info(f"Starting ImgSender to {address} over {transport}")
         self.jpeg_quality = jpeg_quality
-        self.sender = imagezmq.ImageSender(connect_to=address)
+        # with adaptive settings JPEG quality (up to jpeg_quality) and scale follow the link
+        self.controller = None
+        if adaptive:
+            self.controller = AdaptiveQuality(**{"max_quality": jpeg_quality, **adaptive})
+            logging.info(f"ImgSender adaptive quality ladder: {self.controller.ladder}")
+        # with spool settings frames that cannot be sent are stored on disk and sent once the link is back
+        self.spool = None
+        self.retry_interval = 5.0
+        if spool:
+            spool = dict(spool)
+            self.retry_interval = spool.pop("retry_interval", self.retry_interval)
+            self.spool = FrameSpool(**spool)
+        # with tiling settings periodic frames carry only tiles showing new ground
+        self.tiler = TileSelector(**{"fov_x": fov_x, **tiling}) if tiling else None
+        # monotonic time of the last failed send, None while the link works
+        self.link_failed_at = None
+        self.sender = FrameTransportSender(
+            address,
+            mode=transport,
+            max_in_flight=max_in_flight,
+            send_hwm=send_hwm,
+            ack_timeout=ack_timeout,
+            zero_copy=zero_copy,
+            keep_unacked=self.spool is not None,
+        )
         self.running = True
-        self.frame_queue = queue.Queue(maxsize=max_queue_size)
+        # frames are numbered by the sending thread and by add_frame_to_send when spooling
+        self.frame_ids = itertools.count()
+        # trigger frames go first, preview keeps only the latest thumbnail, periodic frames are evicted first
+        self.frame_queue = PrioritySendQueue(maxsize=max_queue_size)
         self.sending_thread = Thread(target=self.sending_loop)
         self.sending_thread.start()
+        # frames evicted from the full queue are encoded and spooled here, not on the producer's thread
+        self.evicted = None
+        if self.spool is not None:
+            self.evicted = queue.Queue(maxsize=max_queue_size)
+            self.spooling_thread = Thread(target=self.spooling_loop, name="spooler")
+            self.spooling_thread.start()
 
-    def add_frame_to_send(self, frame: GeorefFrame):
-        try:
-            self.frame_queue.put_nowait(frame)
-        except queue.Full:
-            logging.warning("ImgSender: frame queue is full, dropping frame.")
+    def add_frame_to_send(self, frame: GeorefFrame, lane: str = "periodic"):
+        """Queue frame in send_queue.LANES lane: trigger, preview or periodic."""
+        frame.lane = lane
+        for dropped in self.frame_queue.put(frame, lane):
+            if dropped.lane != "preview":
+                if self.evicted is not None:
+                    try:
+                        self.evicted.put_nowait(dropped)
+                        continue
+                    except queue.Full:
+                        logging.warning(f"ImgSender: spooling is behind, dropping {dropped.lane} frame {dropped.name}.")
+                else:
+                    logging.warning(f"ImgSender: frame queue is full, dropping {dropped.lane} frame {dropped.name}.")
+            dropped.release()
 
     def sending_loop(self):
         while self.running:
+            replay = self.spool is not None and self.__link_usable() and len(self.spool) > 0
+            # spooled frames are sent only when no new frame is waiting
+            item = self.frame_queue.get(timeout=0 if replay else 0.1)
             try:
-                frame = self.frame_queue.get(timeout=0.1)
-            except queue.Empty:
-                continue
-            try:
-                self.send_frame(frame)
-                logging.debug("Sent frame " + frame.name)
+                if item is None:
+                    if replay:
+                        self.__replay_spooled()
+                    elif self.spool is not None:
+                        self.sender.collect_acks()
+                    continue
+                frame, lane, queued = item
+                try:
+                    if not self.__link_usable():
+                        # link is down, park the frame on disk instead of waiting for a timeout
+                        if lane != "preview":
+                            self.__spool_frame(frame)
+                        continue
+                    self.send_frame(frame)
+                    self.__link_ok()
+                    self.frame_queue.record_sent(lane, queued)
+                    logging.debug("Sent frame " + frame.name)
+                except zmq.error.Again:
+                    if self.spool is None:
+                        logging.warning(f"ImgSender: send of {frame.name} timed out, dropping frame.")
+                    else:
+                        self.__link_failed()
+                        if lane != "preview":
+                            self.__spool_frame(frame)
+                finally:
+                    frame.release()
             except (KeyboardInterrupt, SystemExit, zmq.error.ContextTerminated):
                 break
             except Exception as ex:
                 logging.warning("Img sender, Traceback error:", exc_info=ex)
             finally:
-                self.frame_queue.task_done()
+                self.__spool_unacked()
 
     def send_frame(self, frame: GeorefFrame):
-        import json
+        tiles, footprint = None, None
+        if self.tiler is not None and frame.lane == "periodic":
+            quality, scale = self.__settings(frame)
+            height, width = frame.image.shape[:2]
+            tiles, footprint = self.tiler.select(frame.drone_data, round(width * scale), round(height * scale))
+            if tiles is not None and not tiles["mask"]:
+                logging.debug(f"ImgSender: {frame.name} shows no new ground, not sending it.")
+                return
+        jpg_buffer = self.__encode(frame) if tiles is None else self.__encode_tiles(frame, tiles)
+        start = time.perf_counter()
+        self.__send(frame, jpg_buffer)
+        if self.tiler is not None:
+            self.tiler.commit(footprint)
+        if self.controller:
+            # without acks (push) the time send() blocks on a full link is the only latency signal
+            latency = self.sender.last_rtt if self.sender.last_rtt is not None else time.perf_counter() - start
+            self.controller.update(latency, self.frame_queue.qsize())
 
-        meta_dict = dataclasses.asdict(frame.drone_data)
-        meta_dict["name"] = frame.name
+    def __settings(self, frame: GeorefFrame) -> tuple:
+        """JPEG quality and scale to send frame with."""
+        quality, scale = self.jpeg_quality, 1.0
+        if self.controller:
+            quality, scale = self.controller.quality, self.controller.scale
+        if frame.lane == "preview":
+            # thumbnails are already small
+            scale = 1.0
+        return quality, scale
 
-        meta_str = json.dumps(meta_dict)
-        jpg_buffer = simplejpeg.encode_jpeg(
-            frame.image, quality=self.jpeg_quality, colorspace="BGR"
-        )
-        self.sender.send_jpg(meta_str, jpg_buffer)
+    def __encode(self, frame: GeorefFrame) -> bytes:
+        quality, scale = self.__settings(frame)
+        jpg_buffer = frame.jpeg(quality, scale)
+        height, width = frame.image.shape[:2]
+        frame.encoding = {"quality": quality, "width": round(width * scale), "height": round(height * scale)}
+        frame.tiles = None
+        return jpg_buffer
+
+    def __encode_tiles(self, frame: GeorefFrame, tiles: dict) -> bytes:
+        quality, scale = self.__settings(frame)
+        image = frame.image
+        if scale != 1.0:
+            size = (round(image.shape[1] * scale), round(image.shape[0] * scale))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        jpg_buffer = default_encoder().encode(pack_tiles(image, tiles), quality)
+        frame.encoding = {"quality": quality, "width": image.shape[1], "height": image.shape[0]}
+        frame.tiles = tiles
+        return jpg_buffer
+
+    def __send(self, frame: GeorefFrame, jpg_buffer):
+        frame.frame_id = next(self.frame_ids)
+        # the JPEG is handed to ZMQ as is, the frame keeps no reference that could change it
+        self.sender.send(pack_header(frame, frame.frame_id), jpg_buffer)
+
+    def __spool_frame(self, frame: GeorefFrame):
+        # frames that failed to send keep their frame id, the GCS may have received them
+        jpg_buffer = self.__encode(frame)
+        if frame.frame_id is None:
+            frame.frame_id = next(self.frame_ids)
+        if self.spool.append(pack_header(frame, frame.frame_id), jpg_buffer):
+            logging.debug(f"ImgSender: spooled {frame.lane} frame {frame.name}.")
+        else:
+            logging.warning(f"ImgSender: {frame.name} does not fit in the spool, dropping frame.")
+
+    def spooling_loop(self):
+        while True:
+            frame = self.evicted.get()
+            if frame is None:
+                break
+            try:
+                self.__spool_frame(frame)
+            except Exception as ex:
+                logging.warning(f"ImgSender: spooling {frame.name} failed:", exc_info=ex)
+            finally:
+                frame.release()
+
+    def __spool_unacked(self, in_flight: bool = False):
+        if self.spool is None:
+            return
+        unacked = self.sender.take_unacked(in_flight)
+        for header, jpg_buffer in unacked:
+            self.spool.append(header, jpg_buffer)
+        if unacked and not in_flight:
+            self.__link_failed()
+
+    def __replay_spooled(self):
+        entry = self.spool.peek()
+        if entry is None:
+            return
+        key, header, jpg_buffer = entry
+        try:
+            self.sender.send(header, jpg_buffer)
+        except zmq.error.Again:
+            self.__link_failed()
+            return
+        self.spool.done(key)
+        self.__link_ok()
+
+    def __link_usable(self) -> bool:
+        # while the link is down one send per retry_interval probes it
+        return self.link_failed_at is None or time.monotonic() - self.link_failed_at >= self.retry_interval
+
+    def __link_failed(self):
+        if self.link_failed_at is None and self.spool is not None:
+            logging.warning(f"ImgSender: link to the GCS is down, spooling frames to {self.spool.path}.")
+        self.link_failed_at = time.monotonic()
+
+    def __link_ok(self):
+        if self.link_failed_at is not None and self.spool is not None:
+            logging.info(f"ImgSender: link to the GCS is back, {len(self.spool)} frames spooled.")
+        self.link_failed_at = None
 
     def stop(self):
         logging.info("Stopping ImgSender...")
         self.running = False
-        self.sender.zmq_socket.close(linger=0)
-        self.sender.close()
+        # sends give up after ack_timeout, so the thread ends in bounded time
         self.sending_thread.join()
+        if self.spool is not None:
+            # frames still waiting for acks or in the queue are sent in the next run
+            self.sender.collect_acks()
+            self.__spool_unacked(in_flight=True)
+            self.evicted.put(None)
+            self.spooling_thread.join()
+        self.sender.close()
+        for frame in self.frame_queue.drain():
+            if self.spool is not None and frame.lane != "preview":
+                self.__spool_frame(frame)
+            frame.release()
+        for line in self.frame_queue.summary():
+            logging.info(f"ImgSender {line}")
+        if self.tiler is not None:
+            logging.info(f"ImgSender tiling: {self.tiler.summary()}")
+        if self.spool is not None:
+            logging.info(f"ImgSender spool: {self.spool.summary()}")
+            self.spool.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+"""Offline orthomosaic from saved frames on all CPU cores.
+
+Frame metadata is read in a process pool, then the map is cut into vertical
+stripes of whole tile columns with a similar amount of frame overlap each.
+Every worker decodes and warps the frames overlapping its stripe and blends
+them, in frame order, into its own tiles, so no locks are needed. Frames
+are warped clipped to the stripe, which rounds interpolation slightly
+differently, so pixels near stripe seams can differ from a serial build by a
+few LSB (at most 3 on the samples). The stripes are merged at the end.
+Workers are capped at the CPU count, extra processes only add decoding of
+frames shared by stripes.
+
+Usage:
+  python -m map_visualization.batch_mosaic data/*/frames -o orthomap.png -j 8
+"""
+import argparse
+import glob
+import logging
+import math
+import os
+import time
+import multiprocessing as mp
+import cv2
+import numpy as np
+from PIL import Image
+from map_visualization.mosaic import Mosaic
+from map_visualization.real_time_mapping import get_img_param
+from map_visualization.tile_store import TILE_SIZE
+
+# stripes per worker, more stripes balance better but decode shared frames more times
+STRIPES_PER_WORKER = 2
+
+
+def read_frame_info(path):
+    """(path, width, height, lat, lon, rel_alt, yaw) of a saved frame, None without EXIF."""
+    try:
+        param = get_img_param(path)
+    except Exception as e:
+        logging.warning(f"Cannot read EXIF of {path}: {e}")
+        return None
+    if param is None:
+        return None
+    alt, lat, lon, cam_direction = param
+    with Image.open(path) as img:
+        width, height = img.size
+    return path, width, height, lat, lon, alt, math.radians(cam_direction)
+
+
+def partition_columns(column_load: np.ndarray, parts: int):
+    """Split tile columns into at most parts contiguous ranges of similar total load."""
+    cumulative = np.cumsum(column_load)
+    targets = cumulative[-1] * np.arange(1, parts) / parts
+    cuts = np.unique(np.searchsorted(cumulative, targets, side="right"))
+    cuts = cuts[(cuts > 0) & (cuts < len(column_load))]
+    bounds = [0, *cuts.tolist(), len(column_load)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _init_worker():
+    # parallelism comes from the pool
+    cv2.setNumThreads(1)
+
+
+def build_stripe(task):
+    """Blend frames into the tiles of one stripe, returns the stripe tiles."""
+    clip, frames, options = task
+    mosaic = Mosaic(levels=0, **options)
+    for path, _, _, lat, lon, alt, yaw in frames:
+        image = cv2.imread(path)
+        if image is None:
+            logging.warning(f"Cannot decode {path}, skipping it.")
+            continue
+        mosaic.add_frame(image, lat, lon, alt, yaw, clip=clip)
+    return dict(mosaic.store.tiles)
+
+
+def build_map(paths, workers=None, fov_x=1.74, gsd=None, alpha=0.5, tile_size=TILE_SIZE):
+    """Orthomosaic of frames in paths (in that order), returns (Mosaic, number of frames used)."""
+    workers = min(workers or os.cpu_count(), os.cpu_count())
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker) as pool:
+        infos = [info for info in pool.map(read_frame_info, paths, chunksize=16) if info]
+        if not infos:
+            return Mosaic(fov_x=fov_x, gsd=gsd, alpha=alpha, tile_size=tile_size, levels=0), 0
+
+        # placement of all frames fixes the map reference, GSD and extent
+        mosaic = Mosaic(fov_x=fov_x, gsd=gsd, alpha=alpha, tile_size=tile_size, levels=0)
+        placed = []
+        for info in infos:
+            placement = mosaic.placement(*info[1:])
+            if placement is not None:
+                placed.append((info, placement[1]))
+        if not placed:
+            return mosaic, 0
+        boxes = np.array([box for _, box in placed])
+        tx0 = boxes[:, 0].min() // tile_size
+        tx1 = (boxes[:, 2].max() - 1) // tile_size + 1
+        column_load = np.zeros(tx1 - tx0)
+        for x0, y0, x1, y1 in boxes:
+            column_load[x0 // tile_size - tx0 : (x1 - 1) // tile_size - tx0 + 1] += y1 - y0
+
+        options = dict(fov_x=fov_x, gsd=mosaic.gsd, alpha=alpha, tile_size=tile_size, ref=mosaic.ref)
+        tasks = []
+        for c0, c1 in partition_columns(column_load, workers * STRIPES_PER_WORKER):
+            clip = ((tx0 + c0) * tile_size, boxes[:, 1].min(), (tx0 + c1) * tile_size, boxes[:, 3].max())
+            frames = [info for info, box in placed if box[0] < clip[2] and box[2] > clip[0]]
+            tasks.append((clip, frames, options))
+        logging.info(f"{len(placed)} frames in {len(tasks)} stripes on {workers} workers.")
+        # stripes own disjoint tile columns, merging is a plain union
+        for tiles in pool.imap_unordered(build_stripe, tasks):
+            mosaic.store.tiles.update(tiles)
+    return mosaic, len(placed)
+
+
+def find_frames(sources):
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths += sorted(glob.glob(os.path.join(source, "*.jpg")))
+        else:
+            paths += sorted(glob.glob(source))
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel offline orthomosaic builder")
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        help="Set the logging level (default: INFO)",
+    )
+    parser.add_argument("sources", nargs="+", help="Frame directories or glob patterns, e.g. data/*/frames")
+    parser.add_argument("-o", "--output", default="orthomap.png", help="Output image (default: orthomap.png)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes, at most the CPU count (default: CPU count)")
+    parser.add_argument("--fov-x", type=float, default=1.74, help="Camera horizontal field of view in radians (default: 1.74)")
+    parser.add_argument("--gsd", type=float, default=None, help="Map meters per pixel (default: GSD of the first frame)")
+    parser.add_argument("--alpha", type=float, default=0.5, help="Weight of new frames in overlaps (default: 0.5)")
+    parser.add_argument("--tile-size", type=int, default=TILE_SIZE)
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper()),
+        format="%(asctime)s %(levelname)s: %(message)s",
+    )
+    paths = find_frames(args.sources)
+    start = time.perf_counter()
+    mosaic, frames = build_map(paths, args.workers, args.fov_x, args.gsd, args.alpha, args.tile_size)
+    elapsed = time.perf_counter() - start
+    logging.info(f"{frames}/{len(paths)} frames mapped in {elapsed:.1f} s, {frames / elapsed:.1f} images/s")
+    if frames:
+        mosaic.save(args.output)
+        logging.info(f"Map saved to {args.output} ({len(mosaic.store)} tiles)")
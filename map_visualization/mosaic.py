@@ -0,0 +1,125 @@
+import logging
+import cv2
+import numpy as np
+from map_visualization.pyramid import TilePyramid
+from map_visualization.tile_store import TileStore, TILE_SIZE
+from projection import CameraModel, geo_to_local
+
+# frames whose footprint is this many times larger than a nadir one look at the horizon
+MAX_FOOTPRINT_SCALE = 4
+# frames taken lower (e.g. on the pad) are not mapped, they would also fix a near zero GSD
+MIN_REL_ALT = 2.0
+
+
+class Mosaic:
+    """Incremental orthomosaic on a sparse tile store.
+
+    Map pixels are anchored at the first frame position, x grows east and y
+    grows south, one pixel is gsd meters (the first frame GSD by default).
+    Frames are projected with the full camera pose, images are BGR as decoded
+    by OpenCV or BGRA where only opaque pixels are mapped (partial frames).
+    Downsampled levels for previews are kept in a tile pyramid.
+    """
+
+    def __init__(
+        self,
+        fov_x: float = 1.74,
+        gsd: float = None,
+        alpha: float = 0.5,
+        tile_size: int = TILE_SIZE,
+        max_tiles: int = None,
+        spill_dir: str = None,
+        levels: int = 6,
+        ref: tuple = None,
+    ):
+        self.fov_x = fov_x
+        self.gsd = gsd
+        self.alpha = alpha
+        self.ref = ref
+        self.cameras = {}
+        self.store = TileStore(tile_size, max_tiles=max_tiles, spill_dir=spill_dir)
+        self.pyramid = TilePyramid(self.store, levels)
+
+    def camera(self, width: int, height: int) -> CameraModel:
+        camera = self.cameras.get((width, height))
+        if camera is None:
+            camera = self.cameras[(width, height)] = CameraModel(width, height, self.fov_x)
+        return camera
+
+    def geo_to_pixel(self, lat, lon):
+        east, north = geo_to_local(lat, lon, *self.ref)
+        return east / self.gsd, -north / self.gsd
+
+    def ground_to_map(self, lat: float, lon: float) -> np.ndarray:
+        """Affine matrix from ground (east, north) meters around lat/lon to map pixels."""
+        x, y = self.geo_to_pixel(lat, lon)
+        return np.array([[1 / self.gsd, 0, x], [0, -1 / self.gsd, y], [0, 0, 1]])
+
+    def add_frame(
+        self,
+        image: np.ndarray,
+        lat: float,
+        lon: float,
+        rel_alt: float,
+        yaw: float,
+        roll: float = 0.0,
+        pitch: float = 0.0,
+        clip: tuple = None,
+    ):
+        """Project image taken at lat/lon, rel_alt meters above ground with given attitude (radians).
+
+        With clip (x0, y0, x1, y1) only that map pixel rectangle is written.
+        Returns keys of the level 0 tiles that changed.
+        """
+        h, w = image.shape[:2]
+        placement = self.placement(w, h, lat, lon, rel_alt, yaw, roll, pitch)
+        if placement is None:
+            return []
+        homography, (x0, y0, x1, y1) = placement
+        if clip:
+            x0, y0 = max(x0, clip[0]), max(y0, clip[1])
+            x1, y1 = min(x1, clip[2]), min(y1, clip[3])
+            if x0 >= x1 or y0 >= y1:
+                return []
+        # image pixels -> map pixels -> destination region
+        to_region = np.array([[1, 0, -x0], [0, 1, -y0], [0, 0, 1]], dtype=np.float64)
+        bgra = image if image.shape[2] == 4 else cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+        warped = cv2.warpPerspective(bgra, to_region @ homography, (x1 - x0, y1 - y0), flags=cv2.INTER_LINEAR)
+        touched = self.store.blend(warped, x0, y0, self.alpha)
+        self.pyramid.update(touched)
+        return touched
+
+    def placement(self, width, height, lat, lon, rel_alt, yaw, roll=0.0, pitch=0.0):
+        """Homography from image to map pixels and map bounding box (x0, y0, x1, y1) of a frame.
+
+        The first frame sets the map reference (and GSD if not given). None if
+        the frame does not look at the ground or was taken below MIN_REL_ALT.
+        """
+        if rel_alt is None or rel_alt < MIN_REL_ALT:
+            logging.debug(f"Frame taken {rel_alt} m above ground, skipping it.")
+            return None
+        camera = self.camera(width, height)
+        if self.ref is None:
+            self.ref = (lat, lon)
+        if self.gsd is None:
+            self.gsd = camera.gsd(rel_alt)
+        footprint = camera.footprints(roll, pitch, yaw, rel_alt)[0]
+        if np.isnan(footprint).any():
+            logging.warning("Frame footprint does not hit the ground, skipping it.")
+            return None
+        to_map = self.ground_to_map(lat, lon)
+        corners = footprint @ to_map[:2, :2].T + to_map[:2, 2]
+        x0, y0 = np.floor(corners.min(axis=0)).astype(int)
+        x1, y1 = np.ceil(corners.max(axis=0)).astype(int)
+        if (x1 - x0) * (y1 - y0) > MAX_FOOTPRINT_SCALE * 2 * width * height * (camera.gsd(rel_alt) / self.gsd) ** 2:
+            logging.warning("Frame footprint is too large, camera looks at the horizon, skipping it.")
+            return None
+        homography = to_map @ camera.ground_homography(roll, pitch, yaw, rel_alt)
+        return homography, (int(x0), int(y0), int(x1), int(y1))
+
+    def render(self) -> np.ndarray:
+        """BGRA image of the whole mapped area."""
+        return self.store.render()
+
+    def save(self, path: str) -> None:
+        cv2.imwrite(path, self.render())
@@ -0,0 +1,62 @@
+import cv2
+from map_visualization.tile_store import TileStore
+
+
+class TilePyramid:
+    """Level of detail pyramid over a tile store.
+
+    Level 0 is the full resolution store, every next level is downsampled 2x
+    with the same tile size, so tile (tx, ty) of level n covers tiles
+    (2tx..2tx+1, 2ty..2ty+1) of level n-1. Coarse levels are only updated in
+    the quadrants of tiles that changed.
+    """
+
+    def __init__(self, base: TileStore, levels: int = 6):
+        if base.tile_size % 2:
+            raise ValueError("Tile size has to be even to build a pyramid.")
+        self.levels = [base]
+        for n in range(1, levels + 1):
+            spill_dir = f"{base.spill_dir}/level_{n}" if base.spill_dir else None
+            self.levels.append(TileStore(base.tile_size, max_tiles=base.max_tiles, spill_dir=spill_dir))
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __getitem__(self, level: int) -> TileStore:
+        return self.levels[level]
+
+    @staticmethod
+    def keys_at(keys, level: int) -> set:
+        """Keys of level tiles covering the given level 0 tiles."""
+        return {(tx >> level, ty >> level) for tx, ty in keys}
+
+    def update(self, keys):
+        """Propagate changed level 0 tiles up the pyramid."""
+        dirty = set(keys)
+        half = self.levels[0].tile_size // 2
+        for child_store, store in zip(self.levels, self.levels[1:]):
+            for tx, ty in dirty:
+                child = child_store.get_tile((tx, ty))
+                if child is None:
+                    continue
+                parent = store.get_tile((tx >> 1, ty >> 1), create=True)
+                qx, qy = (tx & 1) * half, (ty & 1) * half
+                parent[qy : qy + half, qx : qx + half] = cv2.resize(
+                    child, (half, half), interpolation=cv2.INTER_AREA
+                )
+            dirty = self.keys_at(dirty, 1)
+
+    def fit_level(self, size: int) -> int:
+        """Finest level showing all tiles in size x size pixels (the top one if none does)."""
+        keys = self.levels[0].keys()
+        if not keys:
+            return 0
+        txs = [k[0] for k in keys]
+        tys = [k[1] for k in keys]
+        ts = self.levels[0].tile_size
+        for level in range(len(self.levels)):
+            tiles_x = (max(txs) >> level) - (min(txs) >> level) + 1
+            tiles_y = (max(tys) >> level) - (min(tys) >> level) + 1
+            if max(tiles_x, tiles_y) * ts <= size:
+                return level
+        return len(self.levels) - 1
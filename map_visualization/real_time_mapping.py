@@ -1,9 +1,13 @@
 import tkinter as tk
-from PIL import Image, ImageTk, ExifTags
+from PIL import Image, ImageTk
 import os
 import math
-import numpy as np
-import time
+import cv2
+from map_visualization.mosaic import Mosaic
+
+def dms_to_deg(dms, ref):
+    deg = float(dms[0] + dms[1]/60 + dms[2]/3600)
+    return -deg if ref in ("S", "W") else deg
 
 def get_img_param(filepath):
     """Read img file description"""
@@ -14,109 +18,104 @@ def get_img_param(filepath):
             alt = float(exif[270].split("rel_alt=")[1].split(",")[0])
         if 34853 in exif:
             gps = exif[34853]
-            gps_N = gps[2]
-            gps_W = gps[4]
-            lat_deg = -float(gps_N[0] + gps_N[1]/60 + gps_N[2]/3600)
-            lon_deg = -float(gps_W[0] + gps_W[1]/60 + gps_W[2]/3600)
+            lat_deg = dms_to_deg(gps[2], gps[1])
+            lon_deg = dms_to_deg(gps[4], gps[3])
             cam_direction = gps[17]
             # print(cam_direction)
         return alt, lat_deg, lon_deg, cam_direction
     return None
 
-def gps_to_pixel_offset(lat_ref, lon_ref, lat, lon, GSD_x):
-    """Convert the GPS coordinate difference into a pixel offset relative to the reference point"""
-    delta_x_m = (lon - lon_ref) * 111320 * math.cos(math.radians(lat_ref))
-    delta_y_m = (lat - lat_ref) * 111320
-    px_offset = int(delta_x_m / GSD_x)
-    py_offset = int(delta_y_m / GSD_x)
-    return px_offset, py_offset
+class MosaicPreview:
+    """Tk canvas with the mosaic at the pyramid level that fits it.
+
+    Every level tile is a separate canvas image, after a frame only the tiles
+    it changed are converted again. The whole view is redrawn only when the
+    level or its origin change, so the cost does not grow with the map.
+    """
+
+    def __init__(self, root, mosaic: Mosaic, size: int = 1000):
+        self.mosaic = mosaic
+        self.size = size
+        self.canvas = tk.Canvas(root, width=size, height=size)
+        self.canvas.pack()
+        self.level = None
+        self.origin = None
+        self.items = {}  # level tile key -> (canvas item, PhotoImage)
+
+    def update(self, keys):
+        pyramid = self.mosaic.pyramid
+        level = pyramid.fit_level(self.size)
+        level_keys = pyramid[level].keys()
+        if not level_keys:
+            # nothing mapped yet, e.g. the first frames were not placed
+            return
+        origin = (min(k[0] for k in level_keys), min(k[1] for k in level_keys))
+        if (level, origin) != (self.level, self.origin):
+            self.level, self.origin = level, origin
+            self.canvas.delete("all")
+            self.items.clear()
+            dirty = level_keys
+        else:
+            dirty = pyramid.keys_at(keys, level)
+        for key in dirty:
+            self.draw_tile(key)
+
+    def draw_tile(self, key):
+        tile = self.mosaic.pyramid[self.level].get_tile(key)
+        if tile is None:
+            return
+        photo = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(tile, cv2.COLOR_BGRA2RGBA), "RGBA"))
+        if key in self.items:
+            item = self.items[key][0]
+            self.canvas.itemconfigure(item, image=photo)
+        else:
+            ts = self.mosaic.store.tile_size
+            x, y = (key[0] - self.origin[0]) * ts, (key[1] - self.origin[1]) * ts
+            item = self.canvas.create_image(x, y, anchor="nw", image=photo)
+        # Tk does not keep a reference to the image
+        self.items[key] = (item, photo)
 
-def generate_map(folder_path="map_visualization/samples", img_width=1280, img_height=720, fov_x=1.74, ortho_width = 5000, ortho_height = 5000,
-                 preview_scale=.4, alpha=.5, show_preview=True):
-    """Main function to generate orthophoto map"""
-    fov_y = fov_x * (img_height / img_width)
 
-    image_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path)]
+def generate_map(folder_path="map_visualization/samples", fov_x=1.74, gsd=None, tile_size=256,
+                 preview_size=1000, alpha=.5, show_preview=True, output_path="map_visualization/orthomap_vis.png"):
+    """Main function to generate orthophoto map"""
+    image_files = sorted(os.path.join(folder_path, f) for f in os.listdir(folder_path))
     images_info = []
 
     for filepath in image_files:
         result = get_img_param(filepath)
         if result:
             alt, lat, lon, cam_direction = result
-            GSD_x = 2 * alt * math.tan(fov_x / 2) / img_width
-            GSD_y = 2 * alt * math.tan(fov_y / 2) / img_height
             images_info.append({
                 "path": filepath,
+                "alt": alt,
                 "lat": lat,
                 "lon": lon,
                 "cam_direction": cam_direction,
-                "GSD_x": GSD_x,
-                "GSD_y": GSD_y
             })
         else:
             print(f"Brak EXIF w {filepath}")
 
-    ortho_map = np.zeros((ortho_height, ortho_width, 4), dtype=np.uint8)
-    ref = images_info[0]
+    mosaic = Mosaic(fov_x=fov_x, gsd=gsd, alpha=alpha, tile_size=tile_size)
 
     if show_preview:
         root = tk.Tk()
         root.title("Podgląd ortofotomapy")
-        canvas = tk.Canvas(root, width=int(ortho_width * preview_scale), height=int(ortho_height * preview_scale))
-        canvas.pack()
-        tk_img = None
+        preview = MosaicPreview(root, mosaic, preview_size)
 
     for info in images_info:
-        img = Image.open(info["path"])
-        rotated_img = img.rotate(-info["cam_direction"], expand=True)
-        img_np = np.array(rotated_img)
-        h, w = img_np.shape[:2]
-    
-        px_offset, py_offset = gps_to_pixel_offset(ref["lat"], ref["lon"], info["lat"], info["lon"], ref["GSD_x"])
-
-        x_start = ortho_width // 2 + px_offset - w // 2
-        y_start = ortho_height // 2 + py_offset - h // 2
-        x_end = x_start + w
-        y_end = y_start + h
-
-        x_start_clip = max(0, x_start)
-        y_start_clip = max(0, y_start)
-        x_end_clip = min(ortho_width, x_end)
-        y_end_clip = min(ortho_height, y_end)
-
-        img_x_start = x_start_clip - x_start
-        img_y_start = y_start_clip - y_start
-        img_x_end = img_x_start + (x_end_clip - x_start_clip)
-        img_y_end = img_y_start + (y_end_clip - y_start_clip)
-
-        img_region = img_np[img_y_start:img_y_end, img_x_start:img_x_end, :]
-
-        img_rgba = np.zeros((img_region.shape[0], img_region.shape[1], 4), dtype=np.uint8)
-        img_rgba[:, :, :3] = img_region
-        img_rgba[:, :, 3] = 255
-
-        ortho_region = ortho_map[y_start_clip:y_end_clip, x_start_clip:x_end_clip, :]
-        ortho_map[y_start_clip:y_end_clip, x_start_clip:x_end_clip, :3] = (
-            img_rgba[:, :, :3].astype(np.float32) * alpha +
-            ortho_region[:, :, :3].astype(np.float32) * (1 - alpha)
-        ).astype(np.uint8)
-
-        ortho_map[y_start_clip:y_end_clip, x_start_clip:x_end_clip, 3] = 255
+        img = cv2.imread(info["path"])
+        tiles = mosaic.add_frame(img, info["lat"], info["lon"], info["alt"], math.radians(info["cam_direction"]))
 
         if show_preview:
-            preview_img = Image.fromarray(ortho_map, "RGBA").resize(
-                (int(ortho_width * preview_scale), int(ortho_height * preview_scale)), Image.ANTIALIAS)
-            tk_img = ImageTk.PhotoImage(preview_img)
-            canvas.create_image(0, 0, anchor="nw", image=tk_img)
+            preview.update(tiles)
             root.update()
 
-    output_folder = "map_visualization"
-    output_path = os.path.join(output_folder, "orthomap_vis.png")
-    Image.fromarray(ortho_map, "RGBA").save(output_path)
-    print(f"Zapisano jako: {output_path}")
+    mosaic.save(output_path)
+    print(f"Zapisano jako: {output_path} ({len(mosaic.store)} kafelków, {mosaic.store.memory_bytes() / 1e6:.1f} MB)")
 
     if show_preview:
         root.mainloop()
 
 if __name__ == "__main__":
-    generate_map()
\ No newline at end of file
+    generate_map()
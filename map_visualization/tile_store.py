@@ -0,0 +1,128 @@
+import collections
+import os
+import cv2
+import numpy as np
+
+TILE_SIZE = 256
+
+
+class TileStore:
+    """Sparse RGBA mosaic made of fixed-size tiles, created when first written to.
+
+    Tiles are keyed by (tx, ty) tile coordinates, pixel (x, y) lies in tile
+    (x // tile_size, y // tile_size), coordinates may be negative. With max_tiles
+    and spill_dir set, least recently used tiles are moved to disk.
+    """
+
+    def __init__(self, tile_size: int = TILE_SIZE, max_tiles: int = None, spill_dir: str = None):
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.spill_dir = spill_dir
+        self.tiles = collections.OrderedDict()
+        self.spilled = set()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self.tiles) + len(self.spilled)
+
+    def keys(self):
+        return list(self.tiles.keys()) + list(self.spilled)
+
+    def __spill_path(self, key):
+        return os.path.join(self.spill_dir, f"tile_{key[0]}_{key[1]}.npy")
+
+    def get_tile(self, key, create=False):
+        """Tile array for key, None if it was never written and create is False."""
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+        if key in self.spilled:
+            tile = np.load(self.__spill_path(key))
+            self.spilled.discard(key)
+        elif create:
+            tile = np.zeros((self.tile_size, self.tile_size, 4), dtype=np.uint8)
+        else:
+            return None
+        self.tiles[key] = tile
+        self.__evict()
+        return tile
+
+    def __evict(self):
+        if not self.max_tiles or not self.spill_dir:
+            return
+        while len(self.tiles) > self.max_tiles:
+            key, tile = self.tiles.popitem(last=False)
+            np.save(self.__spill_path(key), tile)
+            self.spilled.add(key)
+
+    def tile_range(self, x0, y0, x1, y1):
+        """Keys of tiles overlapping pixel rectangle [x0, x1) x [y0, y1)."""
+        ts = self.tile_size
+        for ty in range(y0 // ts, (y1 - 1) // ts + 1):
+            for tx in range(x0 // ts, (x1 - 1) // ts + 1):
+                yield tx, ty
+
+    def blend(self, image: np.ndarray, x0: int, y0: int, alpha: float = 0.5):
+        """Blend BGRA image placed at pixel (x0, y0) into the mosaic.
+
+        Only pixels with full alpha are used: not covered ones are copied,
+        covered ones are mixed with alpha. Only tiles overlapped by the image
+        are touched, returns their keys.
+        """
+        h, w = image.shape[:2]
+        ts = self.tile_size
+        touched = []
+        for tx, ty in self.tile_range(x0, y0, x0 + w, y0 + h):
+            # overlap of the image and the tile in global pixels
+            gx0, gy0 = max(x0, tx * ts), max(y0, ty * ts)
+            gx1, gy1 = min(x0 + w, (tx + 1) * ts), min(y0 + h, (ty + 1) * ts)
+            src = image[gy0 - y0 : gy1 - y0, gx0 - x0 : gx1 - x0]
+            # uint8 masks and cv2.copyTo avoid numpy boolean indexing over 4 channels
+            valid = cv2.compare(src[:, :, 3], 255, cv2.CMP_EQ)
+            if not cv2.countNonZero(valid):
+                continue
+            tile = self.get_tile((tx, ty), create=True)
+            dst = tile[gy0 - ty * ts : gy1 - ty * ts, gx0 - tx * ts : gx1 - tx * ts]
+            covered = cv2.compare(dst[:, :, 3], 0, cv2.CMP_GT)
+            if cv2.countNonZero(covered):
+                mixed = cv2.addWeighted(src, alpha, dst, 1 - alpha, 0)
+                cv2.copyTo(src, cv2.bitwise_and(valid, cv2.bitwise_not(covered)), dst)
+                cv2.copyTo(mixed, cv2.bitwise_and(valid, covered), dst)
+            else:
+                cv2.copyTo(src, valid, dst)
+            touched.append((tx, ty))
+        return touched
+
+    def bounds(self):
+        """Pixel bounds (x0, y0, x1, y1) of all tiles, None when empty."""
+        keys = self.keys()
+        if not keys:
+            return None
+        txs = [k[0] for k in keys]
+        tys = [k[1] for k in keys]
+        ts = self.tile_size
+        return min(txs) * ts, min(tys) * ts, (max(txs) + 1) * ts, (max(tys) + 1) * ts
+
+    def render(self, bounds=None) -> np.ndarray:
+        """Compose RGBA image of pixel rectangle bounds (all tiles by default)."""
+        bounds = bounds or self.bounds()
+        if bounds is None:
+            return np.zeros((0, 0, 4), dtype=np.uint8)
+        x0, y0, x1, y1 = bounds
+        out = np.zeros((y1 - y0, x1 - x0, 4), dtype=np.uint8)
+        ts = self.tile_size
+        for tx, ty in self.tile_range(x0, y0, x1, y1):
+            tile = self.get_tile((tx, ty))
+            if tile is None:
+                continue
+            gx0, gy0 = max(x0, tx * ts), max(y0, ty * ts)
+            gx1, gy1 = min(x1, (tx + 1) * ts), min(y1, (ty + 1) * ts)
+            out[gy0 - y0 : gy1 - y0, gx0 - x0 : gx1 - x0] = tile[
+                gy0 - ty * ts : gy1 - ty * ts, gx0 - tx * ts : gx1 - tx * ts
+            ]
+        return out
+
+    def memory_bytes(self) -> int:
+        return sum(tile.nbytes for tile in self.tiles.values())
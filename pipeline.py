@@ -0,0 +1,96 @@
+import logging
+import queue
+import threading
+import time
+
+
+class StageStats:
+    """Latency and queue depth statistics of a single pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.max_depth = 0
+        self.drops = 0
+
+    def record(self, latency: float, depth: int = 0) -> None:
+        with self.lock:
+            self.count += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self.max_depth = max(self.max_depth, depth)
+
+    def record_drop(self) -> None:
+        with self.lock:
+            self.drops += 1
+
+    def summary(self) -> str:
+        with self.lock:
+            mean_ms = 1000 * self.total_latency / self.count if self.count else 0.0
+            return (
+                f"{self.name}: {self.count} items, latency mean {mean_ms:.1f} ms "
+                f"max {1000 * self.max_latency:.1f} ms, max queue depth {self.max_depth}, "
+                f"drops {self.drops}"
+            )
+
+
+class Stage:
+    """Pipeline stage consuming items from a bounded queue with a handler.
+
+    Threaded stages run in their own worker threads, others are driven by calling
+    run() (e.g. preview stage that has to stay on the main thread).
+    """
+
+    def __init__(
+        self, name: str, handler, maxsize: int, on_drop=None, threaded=True, workers=1
+    ):
+        self.name = name
+        self.handler = handler
+        self.on_drop = on_drop
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stats = StageStats(name)
+        self.threads = []
+        if threaded:
+            self.threads = [
+                threading.Thread(target=self.run, name=f"{name}-{i}") for i in range(workers)
+            ]
+
+    def start(self) -> None:
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, item, block=False) -> bool:
+        """Queue item, without blocking drops it when the stage falls behind."""
+        try:
+            self.queue.put(item, block=block)
+            return True
+        except queue.Full:
+            self.stats.record_drop()
+            if self.on_drop:
+                self.on_drop(item)
+            return False
+
+    def stop(self) -> None:
+        """Queue end markers, the stage finishes after handling already queued items."""
+        for _ in self.threads or [None]:
+            self.queue.put(None)
+
+    def join(self) -> None:
+        for thread in self.threads:
+            thread.join()
+
+    def run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            depth = self.queue.qsize()
+            start = time.perf_counter()
+            try:
+                self.handler(item)
+            except Exception as ex:
+                logging.warning(f"Stage {self.name} failed:", exc_info=ex)
+            self.stats.record(time.perf_counter() - start, depth)
@@ -0,0 +1,81 @@
+"""Camera to ground projection for a nadir camera on the drone.
+
+World frame is local east/north in meters, the camera looks down with the top
+of the image pointing forward (body x). Attitude follows MAVLink ATTITUDE:
+roll, pitch, yaw in radians, yaw clockwise from north.
+"""
+import math
+import numpy as np
+
+METERS_PER_DEG = 111320
+
+# camera axes (x right, y down, z optical axis) expressed in body axes (x forward, y right, z down)
+CAMERA_TO_BODY = np.array([[0.0, -1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+# body NED (north, east, down) to (east, north, down)
+NED_TO_ENU_XY = np.array([[0.0, 1.0, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]])
+# rays closer to the horizon than this are treated as not hitting the ground
+MIN_RAY_DOWN = 0.05
+
+
+class CameraModel:
+    """Pinhole camera with square pixels and principal point in the image center."""
+
+    def __init__(self, width: int, height: int, fov_x: float):
+        self.width = width
+        self.height = height
+        self.fov_x = fov_x
+        focal = (width / 2) / math.tan(fov_x / 2)
+        self.K = np.array([[focal, 0.0, width / 2], [0.0, focal, height / 2], [0.0, 0.0, 1.0]])
+        self.K_inv = np.linalg.inv(self.K)
+        self.corners = np.array(
+            [[0.0, 0.0, 1.0], [width, 0.0, 1.0], [width, height, 1.0], [0.0, height, 1.0]]
+        )
+
+    def gsd(self, rel_alt: float) -> float:
+        """Ground sample distance (m/px) in the image center for a level camera."""
+        return 2 * rel_alt * math.tan(self.fov_x / 2) / self.width
+
+    def rays(self, roll, pitch, yaw) -> np.ndarray:
+        """(N, 3, 3) matrices turning image pixels (u, v, 1) into (east, north, down) rays."""
+        return NED_TO_ENU_XY @ rotation_matrices(roll, pitch, yaw) @ CAMERA_TO_BODY @ self.K_inv
+
+    def ground_homography(self, roll, pitch, yaw, rel_alt) -> np.ndarray:
+        """Homography from image pixels to ground (east, north) meters from the camera nadir."""
+        rays = self.rays(roll, pitch, yaw)[0]
+        return np.diag([rel_alt, rel_alt, 1.0]) @ rays
+
+    def footprints(self, roll, pitch, yaw, rel_alt) -> np.ndarray:
+        """Ground corners (N, 4, 2) of N frames as (east, north) meters from each camera nadir.
+
+        Corners of rays that do not hit the ground are NaN.
+        """
+        rays = self.rays(roll, pitch, yaw) @ self.corners.T  # (N, 3, 4)
+        down = rays[:, 2, :]
+        scale = np.where(down > MIN_RAY_DOWN, np.asarray(rel_alt, dtype=np.float64).reshape(-1, 1) / down, np.nan)
+        return np.stack((rays[:, 0, :] * scale, rays[:, 1, :] * scale), axis=-1)
+
+
+def rotation_matrices(roll, pitch, yaw) -> np.ndarray:
+    """Body to NED rotation matrices (N, 3, 3), R = Rz(yaw) Ry(pitch) Rx(roll)."""
+    roll, pitch, yaw = (np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in (roll, pitch, yaw))
+    cr, sr = np.cos(roll), np.sin(roll)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    R = np.empty((len(roll), 3, 3))
+    R[:, 0, 0] = cy * cp
+    R[:, 0, 1] = cy * sp * sr - sy * cr
+    R[:, 0, 2] = cy * sp * cr + sy * sr
+    R[:, 1, 0] = sy * cp
+    R[:, 1, 1] = sy * sp * sr + cy * cr
+    R[:, 1, 2] = sy * sp * cr - cy * sr
+    R[:, 2, 0] = -sp
+    R[:, 2, 1] = cp * sr
+    R[:, 2, 2] = cp * cr
+    return R
+
+
+def geo_to_local(lat, lon, ref_lat: float, ref_lon: float):
+    """Equirectangular (east, north) meters of lat/lon from the reference point."""
+    east = (np.asarray(lon) - ref_lon) * METERS_PER_DEG * math.cos(math.radians(ref_lat))
+    north = (np.asarray(lat) - ref_lat) * METERS_PER_DEG
+    return east, north
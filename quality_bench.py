@@ -0,0 +1,64 @@
+"""Benchmark of frame quality scoring against the camera frame budget.
+
+Scores sample frames at 720p and 1080p and checks that scoring a frame
+stays well inside one frame period. A blurred copy of every frame is scored
+too, to show that the sharpness score separates them.
+
+Usage:
+  python quality_bench.py -n 200 --fps 30
+"""
+import argparse
+import glob
+import os
+import time
+import cv2
+import numpy as np
+
+from image_quality import quality_scores, SCORE_WIDTH
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def load_frames(samples_dir, width, height, count=8):
+    samples = sorted(glob.glob(os.path.join(samples_dir, "*.jpg")))[:count]
+    if samples:
+        return [cv2.resize(cv2.imread(path), (width, height)) for path in samples]
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def bench(frames, n, width):
+    quality_scores(frames[0], width)  # warm up
+    times = []
+    for i in range(n):
+        start = time.perf_counter()
+        quality_scores(frames[i % len(frames)], width)
+        times.append(time.perf_counter() - start)
+    return 1000 * np.array(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame quality scoring benchmark")
+    parser.add_argument("-n", type=int, default=200, help="Frames per measurement")
+    parser.add_argument("--fps", type=float, default=30, help="Camera rate defining the frame budget")
+    parser.add_argument("--width", type=int, default=SCORE_WIDTH, help="Width of the scored copy")
+    parser.add_argument("--samples", default="map_visualization/samples", help="Folder with sample JPEGs")
+    args = parser.parse_args()
+
+    budget_ms = 1000 / args.fps
+    print(f"Frame budget at {args.fps} fps: {budget_ms:.1f} ms, scored at width {args.width}")
+    for label, (width, height) in RESOLUTIONS.items():
+        frames = load_frames(args.samples, width, height)
+        times = bench(frames, args.n, args.width)
+        p95 = np.percentile(times, 95)
+        print(
+            f"{label:6s}: mean {times.mean():6.2f} ms, p95 {p95:6.2f} ms, "
+            f"{100 * p95 / budget_ms:5.1f}% of budget {'OK' if p95 < budget_ms else 'OVER BUDGET'}"
+        )
+        sharp = [quality_scores(f, args.width)["score"] for f in frames]
+        blurred = [quality_scores(cv2.GaussianBlur(f, (0, 0), 3), args.width)["score"] for f in frames]
+        print(f"        score sharp {np.mean(sharp):8.1f}, blurred {np.mean(blurred):8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Adaptive JPEG quality and resolution for the frame sender.
+
+Encoding settings form a ladder of (scale, quality) rungs ordered from the
+largest to the smallest JPEG: quality goes down first, then resolution. The
+controller steps down as soon as the smoothed round trip time is over the
+target or frames pile up in the send queue, and steps back up slowly while
+the link has headroom, holding the target latency instead of dropping frames.
+"""
+import logging
+
+
+class AdaptiveQuality:
+    def __init__(
+        self,
+        max_quality: int = 80,
+        min_quality: int = 40,
+        quality_step: int = 10,
+        scales: tuple = (1.0, 0.75, 0.5),
+        target_latency: float = 0.5,
+        max_queue_depth: int = 2,
+        headroom: float = 0.6,
+        up_after: int = 5,
+        down_hold: int = 2,
+        smoothing: float = 0.3,
+    ):
+        qualities = list(range(max_quality, min_quality - 1, -quality_step)) or [max_quality]
+        # full resolution at every quality, then lower resolutions at the lowest quality range
+        self.ladder = [(scales[0], q) for q in qualities]
+        for scale in scales[1:]:
+            self.ladder += [(scale, q) for q in qualities[len(qualities) // 2 :]]
+        self.target_latency = target_latency
+        self.max_queue_depth = max_queue_depth
+        self.headroom = headroom
+        self.up_after = up_after
+        # frames encoded before a step down are still in flight, wait for them
+        self.down_hold = down_hold
+        self.smoothing = smoothing
+        self.rung = 0
+        self.good_samples = 0
+        self.hold = 0
+        self.latency = None
+
+    @property
+    def scale(self) -> float:
+        return self.ladder[self.rung][0]
+
+    @property
+    def quality(self) -> int:
+        return self.ladder[self.rung][1]
+
+    def update(self, latency: float, queue_depth: int) -> None:
+        """Feed the latency of the last sent frame (None if unknown) and the send queue depth."""
+        if latency is not None:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.smoothing * (latency - self.latency)
+        congested = queue_depth > self.max_queue_depth or (
+            self.latency is not None and self.latency > self.target_latency
+        )
+        if self.hold:
+            self.hold -= 1
+        if congested:
+            self.good_samples = 0
+            if self.rung < len(self.ladder) - 1 and not self.hold:
+                self.rung += 1
+                self.hold = self.down_hold
+                logging.debug(f"Link congested (latency {self.latency}, queue {queue_depth}), {self.describe()}")
+            return
+        if queue_depth == 0 and (self.latency is None or self.latency < self.headroom * self.target_latency):
+            self.good_samples += 1
+            if self.good_samples >= self.up_after and self.rung > 0:
+                self.rung -= 1
+                self.good_samples = 0
+                logging.debug(f"Link has headroom (latency {self.latency}), {self.describe()}")
+        else:
+            self.good_samples = 0
+
+    def describe(self) -> str:
+        return f"sending at quality {self.quality}, scale {self.scale}"
@@ -1,7 +1,144 @@
 import cv2
+import numpy as np
 import yaml
 import argparse
+import logging
 import os
+import time
+from models import DroneData
+from telemetry_log import (
+    TelemetryLogWriter,
+    read_telemetry_log,
+    record_to_dict,
+)
+
+INDEX_VERSION = 1
+
+
+def find_video(directory):
+    for ext in (".mp4", ".mkv", ".avi"):
+        for f in sorted(os.listdir(directory)):
+            if f.endswith(ext):
+                return f
+    return None
+
+
+def yaml_to_telemetry_log(yaml_path, log_path):
+    """Convert telemetry.yaml of older sessions to a binary log, done once per session."""
+    with open(yaml_path, "r") as f:
+        telems = yaml.safe_load(f) or []
+    writer = TelemetryLogWriter(log_path)
+    for i, tele in enumerate(telems):
+        writer.append(i, None, DroneData(**tele) if tele else None)
+    writer.close()
+
+
+class Replayer:
+    """Random access over a recorded session: video frames with frame indexed telemetry.
+
+    Frame timestamps and the frame -> telemetry record mapping are built in one pass
+    over the video and cached in a sidecar index next to it.
+    """
+
+    def __init__(self, directory, video_file=None, telemetry_file=None):
+        video_file = video_file or find_video(directory)
+        if not video_file:
+            raise FileNotFoundError(f"No video file found in {directory}")
+        self.video_path = os.path.join(directory, video_file)
+        self.cap = cv2.VideoCapture(self.video_path)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"Could not open video file {self.video_path}")
+        self.telemetry = self.__load_telemetry(directory, telemetry_file)
+        self.index_path = self.video_path + ".index.npz"
+        self.frame_times, self.telemetry_rows = self.__load_index()
+        self.position = 0
+
+    def __load_telemetry(self, directory, telemetry_file):
+        if not telemetry_file:
+            telemetry_file = "telemetry.bin"
+            if not os.path.exists(os.path.join(directory, telemetry_file)):
+                telemetry_file = "telemetry.yaml"
+        path = os.path.join(directory, telemetry_file)
+        if not os.path.exists(path):
+            logging.warning(f"Telemetry file not found: {path}")
+            return None
+        if path.endswith((".yaml", ".yml")):
+            log_path = path + ".bin"
+            if not os.path.exists(log_path) or os.path.getmtime(log_path) < os.path.getmtime(path):
+                logging.info(f"Converting {path} to {log_path}")
+                yaml_to_telemetry_log(path, log_path)
+            path = log_path
+        logging.info(f"Telemetry from {path}")
+        return read_telemetry_log(path)
+
+    def __index_key(self):
+        stat = os.stat(self.video_path)
+        telemetry_len = len(self.telemetry) if self.telemetry is not None else -1
+        return np.array([INDEX_VERSION, stat.st_size, stat.st_mtime_ns, telemetry_len], dtype=np.int64)
+
+    def __load_index(self):
+        key = self.__index_key()
+        if os.path.exists(self.index_path):
+            with np.load(self.index_path) as index:
+                if np.array_equal(index["key"], key):
+                    return index["frame_times"], index["telemetry_rows"]
+        logging.info(f"Indexing {self.video_path}...")
+        frame_times = []
+        while self.cap.grab():
+            frame_times.append(self.cap.get(cv2.CAP_PROP_POS_MSEC))
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        frame_times = np.array(frame_times, dtype=np.float64)
+        telemetry_rows = np.full(len(frame_times), -1, dtype=np.int64)
+        if self.telemetry is not None:
+            frames = np.asarray(self.telemetry["frame"], dtype=np.int64)
+            valid = frames < len(frame_times)
+            telemetry_rows[frames[valid]] = np.nonzero(valid)[0]
+        np.savez(self.index_path, key=key, frame_times=frame_times, telemetry_rows=telemetry_rows)
+        logging.info(f"Indexed {len(frame_times)} frames to {self.index_path}")
+        return frame_times, telemetry_rows
+
+    def __len__(self):
+        return len(self.frame_times)
+
+    def frame_at_time(self, t_ms: float) -> int:
+        """Frame shown at video time t_ms."""
+        return max(0, int(np.searchsorted(self.frame_times, t_ms, side="right")) - 1)
+
+    def drone_data(self, frame_num: int):
+        row = self.telemetry_rows[frame_num] if 0 <= frame_num < len(self) else -1
+        if row < 0:
+            return None
+        tele = record_to_dict(self.telemetry[row])
+        if None in tele.values():
+            return None
+        return DroneData(**tele)
+
+    def seek(self, frame_num: int) -> None:
+        frame_num = min(max(0, frame_num), len(self))
+        if frame_num != self.position:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+            self.position = frame_num
+
+    def read(self):
+        """Read frame at current position, returns (frame_num, time_ms, frame, drone_data)."""
+        frame_num = self.position
+        ret, frame = self.cap.read()
+        if not ret:
+            return None
+        self.position += 1
+        return frame_num, self.frame_times[frame_num], frame, self.drone_data(frame_num)
+
+    def frames(self, start=0, end=None):
+        self.seek(start)
+        end = len(self) if end is None else min(end, len(self))
+        while self.position < end:
+            item = self.read()
+            if item is None:
+                break
+            yield item
+
+    def release(self):
+        self.cap.release()
 
 
 def main():
@@ -12,7 +149,7 @@ def main():
         "--dir",
         type=str,
         required=True,
-        help="Path to the output directory (containing video and telemetry.yaml)",
+        help="Path to the output directory (containing video and telemetry.bin or telemetry.yaml)",
     )
     parser.add_argument(
         "--video",
@@ -23,55 +160,124 @@ def main():
     parser.add_argument(
         "--telemetry",
         type=str,
-        default="telemetry.yaml",
-        help="Telemetry YAML filename (default: telemetry.yaml)",
+        default=None,
+        help="Telemetry filename, binary log or YAML (default: telemetry.bin, then telemetry.yaml)",
+    )
+    parser.add_argument(
+        "--mode",
+        default="realtime",
+        choices=["realtime", "fast", "step"],
+        help="Playback speed: recorded timing, as fast as possible or frame by frame (default: realtime)",
+    )
+    parser.add_argument("--start-frame", type=int, default=None, help="Frame number to start from")
+    parser.add_argument("--start-time", type=float, default=None, help="Video time in seconds to start from")
+    parser.add_argument("--end-frame", type=int, default=None, help="Frame number to stop at (exclusive)")
+    parser.add_argument("--headless", action="store_true", help="Do not open a preview window")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Do not print telemetry of every frame")
+    parser.add_argument(
+        "--select-dir",
+        default=None,
+        help="Feed frames through FrameSelector, saving selected frames to this folder",
+    )
+    parser.add_argument("--select-nth", type=int, default=10, help="FrameSelector nth frame (default: 10)")
+    parser.add_argument(
+        "--select-mode", default="nth", choices=("nth", "coverage"), help="FrameSelector mode (default: nth)"
+    )
+    parser.add_argument(
+        "--coverage-overlap",
+        type=float,
+        default=0.7,
+        help="Coverage mode: select when no recently selected frame covers this much of a frame (default: 0.7)",
+    )
+    parser.add_argument(
+        "--quality-window", type=int, default=1, help="FrameSelector picks the sharpest of this many frames (default: 1)"
+    )
+    parser.add_argument("--fov-x", type=float, default=1.74, help="Camera horizontal field of view in radians (default: 1.74)")
+    parser.add_argument("--send-ip", default="127.0.0.1", help="FrameSelector GCS address (default: 127.0.0.1)")
+    parser.add_argument(
+        "-c", "--config", default=None, help="Companion YAML config, selected frames use its encoder: section"
+    )
+    parser.add_argument(
+        "-l",
+        "--log-level",
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+        help="Set the logging level (default: INFO)",
     )
     args = parser.parse_args()
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper()),
+        format="%(asctime)s %(levelname)s: %(message)s",
+    )
 
-    directory = args.dir
-    video_file = args.video
-    if not video_file:
-        # Try to find a video file in the directory
-        for ext in (".mp4", ".mkv", ".avi"):
-            for f in os.listdir(directory):
-                if f.endswith(ext):
-                    video_file = f
-                    break
-            if video_file:
-                break
-        if not video_file:
-            print("No video file found in directory.")
-            return
-    video_path = os.path.join(directory, video_file)
-    print(f"Playing video: {video_path}")
-
-    telemetry_path = os.path.join(directory, args.telemetry)
-    telems = []
-    if not os.path.exists(telemetry_path):
-        print(f"Telemetry file not found: {telemetry_path}")
-        return
-    print(f"\nTelemetry from {telemetry_path}:")
-    with open(telemetry_path, "r") as f:
-        telems = yaml.safe_load(f)
-
-    # Play video
-    cap = cv2.VideoCapture(video_path)
-    frame_num = 0
-    if not cap.isOpened():
-        print("Error: Could not open video file.")
+    try:
+        replayer = Replayer(args.dir, args.video, args.telemetry)
+    except (FileNotFoundError, RuntimeError) as ex:
+        print(f"Error: {ex}")
         return
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        tele = telems[frame_num] if frame_num < len(telems) else {}
-        print(f"Frame {frame_num}: {tele}")
-        frame_num += 1
-        cv2.imshow("Video", frame)
-        if cv2.waitKey(30) & 0xFF == ord("q"):
-            break
-    cap.release()
-    cv2.destroyAllWindows()
+    print(f"Playing video: {replayer.video_path} ({len(replayer)} frames)")
+
+    start = 0
+    if args.start_frame is not None:
+        start = args.start_frame
+    elif args.start_time is not None:
+        start = replayer.frame_at_time(args.start_time * 1000)
+
+    frame_selector = None
+    if args.select_dir:
+        from encoders import create_encoder, set_default_encoder
+        from frame_selector import FrameSelector
+
+        if args.config:
+            with open(args.config, "r") as f:
+                config = yaml.safe_load(f) or {}
+            # frames are encoded the way the companion would
+            set_default_encoder(create_encoder(**(config.get("encoder") or {})))
+        os.makedirs(args.select_dir, exist_ok=True)
+        frame_selector = FrameSelector(
+            args.select_dir,
+            args.send_ip,
+            args.select_nth,
+            mode=args.select_mode,
+            coverage_overlap=args.coverage_overlap,
+            fov_x=args.fov_x,
+            quality_window=args.quality_window,
+        )
+
+    frames_num = 0
+    play_start = time.monotonic()
+    first_frame_ms = None
+    try:
+        for frame_num, t_ms, frame, drone_data in replayer.frames(start, args.end_frame):
+            frames_num += 1
+            if not args.quiet:
+                print(f"Frame {frame_num}: {drone_data}")
+            if frame_selector:
+                frame_selector.take_frame(frame, drone_data)
+            if args.mode == "realtime":
+                if first_frame_ms is None:
+                    first_frame_ms = t_ms
+                delay = (t_ms - first_frame_ms) / 1000 - (time.monotonic() - play_start)
+                if delay > 0:
+                    time.sleep(delay)
+            if args.headless:
+                if args.mode == "step":
+                    input("Enter for next frame...")
+                continue
+            cv2.imshow("Video", frame)
+            key = cv2.waitKey(0 if args.mode == "step" else 1) & 0xFF
+            if key == ord("q"):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        elapsed = time.monotonic() - play_start
+        replayer.release()
+        if frame_selector:
+            frame_selector.finish_saving()
+        if not args.headless:
+            cv2.destroyAllWindows()
+        print(f"Played {frames_num} frames in {elapsed:.2f}s ({frames_num / max(elapsed, 1e-9):.1f} fps)")
 
 
 if __name__ == "__main__":
@@ -5,7 +5,7 @@ Performs a sequence of quick diagnostics:
 1. Load provided YAML config.
 2. Open camera (GStreamer pipeline) and grab N test frames.
 3. Check telemetry (MAVLink) heartbeat + receive GLOBAL_POSITION_INT & ATTITUDE.
-4. Test ImageZMQ send (blocking) to an external receiver (e.g. gcs.py) with timeout.
+4. Test frame send to an external receiver (e.g. gcs.py) with timeout.
 5. Verify EXIF written (lat/lon/alt/rel_alt/yaw) to a temp JPEG.
 
 Exit code 0 if all selected checks pass, otherwise non‑zero.
@@ -25,15 +25,15 @@ import os
 import tempfile
 import cv2
 from pymavlink import mavutil
-import json
-import imagezmq
 import simplejpeg
-import dataclasses
-import threading
 import numpy as np
+import zmq
 
 from models import DroneData
 from exif_utils import save_frame_with_gps
+from geo_frame import GeorefFrame
+from transport import FrameTransportSender
+from wire_format import pack_header
 
 
 def check_camera(cfg, grab_frames=5):
@@ -90,50 +90,30 @@ def check_mavlink(cfg, timeout=5.0):
     return data
 
 
-def check_imagezmq_send(frame, drone_data, dest_ip: str, port: int = 5001, attempts: int = 3, per_frame_timeout: float = 2.0):
-    """Attempt to send a few frames to an external ImageZMQ receiver (gcs.py).
+def check_frame_send(frame, drone_data, dest_ip: str, mode: str = "reqrep", port: int = 5001, attempts: int = 3, per_frame_timeout: float = 2.0):
+    """Attempt to send a few frames to an external receiver (gcs.py started with the same transport).
 
-    Because ImageSender (REQ) waits for REP, a missing receiver will block. We protect
-    each send() with a thread + timeout. If any attempt times out or errors, raise.
+    Each send waits at most per_frame_timeout for the ack, push mode has no acks
+    so a sent frame is not a proof of a running receiver. If all attempts fail, raise.
     """
     endpoint = f"tcp://{dest_ip}:{port}"
-    sender = imagezmq.ImageSender(connect_to=endpoint)
-    meta_base = dataclasses.asdict(drone_data)
+    sender = FrameTransportSender(endpoint, mode=mode, ack_timeout=per_frame_timeout)
     jpg_buffer = simplejpeg.encode_jpeg(frame, quality=80, colorspace="BGR")
-
-    def send_once(meta_json, buf):
-        result = {}
-        def worker():
-            print("worker")
+    try:
+        for i in range(1, attempts + 1):
+            geo_frame = GeorefFrame(frame, drone_data, f"sanity_frame_{i}", timestamp=time.time())
             try:
-                sender.send_jpg(meta_json, buf)
-                result['ok'] = True
-            except Exception as e:  # pragma: no cover
-                result['err'] = e
-        t = threading.Thread(target=worker)
-        t.start()
-        t.join(per_frame_timeout)
-        if t.is_alive():
-            return False, TimeoutError(f"send_jpg timeout after {per_frame_timeout}s")
-        if 'err' in result:
-            return False, result['err']
-        return True, None
-
-    for i in range(1, attempts + 1):
-        meta = dict(meta_base)
-        meta['name'] = f"sanity_frame_{i}"
-        meta_json = json.dumps(meta)
-        ok, err = send_once(meta_json, jpg_buffer)
-        sender.zmq_socket.close(linger=0)
-        sender.close()
-        if not ok:
-            sender = imagezmq.ImageSender(connect_to=endpoint)
-            logging.error(f"ImageZMQ send attempt {i}/{attempts} failed: {err}")
-        else:
-            logging.info(f"ImageZMQ send attempt {i}/{attempts} OK")
+                sender.send(pack_header(geo_frame, i), jpg_buffer)
+                if mode == "dealer" and not sender.poll_acks(per_frame_timeout):
+                    raise TimeoutError(f"no ack after {per_frame_timeout}s")
+            except (zmq.Again, TimeoutError) as err:
+                logging.error(f"Frame send attempt {i}/{attempts} failed: {err}")
+                continue
+            logging.info(f"Frame send attempt {i}/{attempts} OK ({mode})")
             return True
-        
-    raise RuntimeError(f"ImageZMQ send failed after {attempts} attempts")
+    finally:
+        sender.close()
+    raise RuntimeError(f"Frame send failed after {attempts} attempts")
 
 
 def check_exif(frame, drone_data):
@@ -159,7 +139,7 @@ def main():
     parser.add_argument("-c", "--config", required=True, help="Config YAML file")
     parser.add_argument("--skip-tele", action="store_true", help="Skip telemetry check")
     parser.add_argument("--skip-video", action="store_true", help="Skip camera check")
-    parser.add_argument("--skip-send", action="store_true", help="Skip ImageZMQ send test")
+    parser.add_argument("--skip-send", action="store_true", help="Skip frame send test")
     parser.add_argument("-l", "--log-level", default="INFO")
     args = parser.parse_args()
     logging.basicConfig(level=getattr(logging, args.log_level.upper()), format="%(asctime)s %(levelname)s: %(message)s")
@@ -205,12 +185,13 @@ def main():
                 drone_data.pitch = 0.0
                 drone_data.yaw = 0.0
             dest_ip = cfg.get('gcs_ip')
-            check_imagezmq_send(last_frame, drone_data, dest_ip=dest_ip)
+            mode = (cfg.get('sender') or {}).get('transport', 'reqrep')
+            check_frame_send(last_frame, drone_data, dest_ip=dest_ip, mode=mode)
         except Exception as e:
-            logging.error(f"ImageZMQ send check FAILED: {e}")
+            logging.error(f"Frame send check FAILED: {e}")
             return 4
     else:
-        logging.info("Skipping ImageZMQ send test.")
+        logging.info("Skipping frame send test.")
 
     try:
         if drone_data.is_initialized() and last_frame is not None:
@@ -0,0 +1,107 @@
+import collections
+import threading
+import time
+import numpy as np
+
+# lanes in priority order:
+# trigger  - frames requested by CAMERA_TRIGGER / CAMERA_IMAGE_CAPTURED
+# preview  - live preview thumbnails, only the latest one is kept
+# periodic - automatically selected frames
+LANES = ("trigger", "preview", "periodic")
+LATEST_ONLY_LANES = ("preview",)
+
+
+class LaneStats:
+    """Queue to sent latency of recent items and drop count of one lane."""
+
+    def __init__(self, name: str, window: int = 1000):
+        self.name = name
+        self.latencies = collections.deque(maxlen=window)
+        self.sent = 0
+        self.dropped = 0
+
+    def summary(self) -> str:
+        if not self.latencies:
+            return f"{self.name}: {self.sent} sent, {self.dropped} dropped"
+        p50, p95, p99 = 1000 * np.percentile(self.latencies, (50, 95, 99))
+        return (
+            f"{self.name}: {self.sent} sent, {self.dropped} dropped, "
+            f"latency p50 {p50:.1f} ms p95 {p95:.1f} ms p99 {p99:.1f} ms"
+        )
+
+
+class PrioritySendQueue:
+    """Bounded multi-lane queue, get() returns items of higher priority lanes first.
+
+    Items are FIFO within a lane. When the queue is full the oldest item of the
+    lowest priority non-empty lane is evicted, an item of lower priority than
+    everything queued is refused. Latest-only lanes keep just the newest item.
+    """
+
+    def __init__(self, maxsize: int = 100):
+        self.maxsize = maxsize
+        self.lanes = {lane: collections.deque() for lane in LANES}
+        self.stats = {lane: LaneStats(lane) for lane in LANES}
+        self.size = 0
+        self.not_empty = threading.Condition()
+
+    def qsize(self) -> int:
+        with self.not_empty:
+            return self.size
+
+    def put(self, item, lane: str = "periodic") -> list:
+        """Queue item, returns items dropped to make room (possibly item itself)."""
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown lane {lane}, use one of {LANES}")
+        dropped = []
+        with self.not_empty:
+            if lane in LATEST_ONLY_LANES:
+                while self.lanes[lane]:
+                    dropped.append(self.__pop_oldest(lane))
+                    self.stats[lane].dropped += 1
+            if self.size >= self.maxsize:
+                victim = next(l for l in reversed(LANES) if self.lanes[l])
+                if LANES.index(victim) < LANES.index(lane):
+                    self.stats[lane].dropped += 1
+                    return dropped + [item]
+                dropped.append(self.__pop_oldest(victim))
+                self.stats[victim].dropped += 1
+            self.lanes[lane].append((item, time.perf_counter()))
+            self.size += 1
+            self.not_empty.notify()
+        return dropped
+
+    def __pop_oldest(self, lane):
+        item, _ = self.lanes[lane].popleft()
+        self.size -= 1
+        return item
+
+    def get(self, timeout: float = None):
+        """(item, lane, queued time) of the highest priority queued item, None on timeout."""
+        with self.not_empty:
+            if not self.not_empty.wait_for(lambda: self.size > 0, timeout):
+                return None
+            lane = next(l for l in LANES if self.lanes[l])
+            item, queued = self.lanes[lane].popleft()
+            self.size -= 1
+        return item, lane, queued
+
+    def record_sent(self, lane: str, queued: float) -> None:
+        """Count item of lane queued at perf_counter time queued as sent now."""
+        with self.not_empty:
+            stats = self.stats[lane]
+            stats.latencies.append(time.perf_counter() - queued)
+            stats.sent += 1
+
+    def drain(self) -> list:
+        """Remove and return all queued items."""
+        with self.not_empty:
+            items = [item for lane in LANES for item, _ in self.lanes[lane]]
+            for lane in LANES:
+                self.lanes[lane].clear()
+            self.size = 0
+        return items
+
+    def summary(self) -> list:
+        with self.not_empty:
+            return [self.stats[lane].summary() for lane in LANES]
@@ -0,0 +1,202 @@
+"""Grid hash over ground footprints of frames.
+
+Footprints are convex quadrilaterals in local (east, north) meters from a
+reference point, the first inserted frame by default. Every footprint is
+registered in the grid cells its bounding box covers, so queries only look
+at frames in the cells around the query region. Works the same with
+DroneData on the companion and with received metadata on the GCS.
+"""
+import math
+import numpy as np
+from models import DroneData
+from projection import CameraModel, geo_to_local
+
+
+def polygon_area(polygon: np.ndarray) -> float:
+    """Area of a simple polygon (N, 2) with the shoelace formula."""
+    return abs(_signed_area(np.asarray(polygon, dtype=np.float64).tolist()))
+
+
+def clip_polygon(subject: np.ndarray, clip: np.ndarray) -> np.ndarray:
+    """Intersection of polygon subject with convex polygon clip (Sutherland-Hodgman)."""
+    # footprints have 4 corners, plain python floats are faster than numpy here
+    clip = np.asarray(clip, dtype=np.float64).tolist()
+    # edges of a counter clockwise clip polygon have its inside on the left
+    if _signed_area(clip) < 0:
+        clip = clip[::-1]
+    output = np.asarray(subject, dtype=np.float64).tolist()
+    for (ax, ay), (bx, by) in zip(clip, clip[1:] + clip[:1]):
+        if not output:
+            break
+        points, output = output, []
+        ex, ey = bx - ax, by - ay
+        sides = [ex * (py - ay) - ey * (px - ax) for px, py in points]
+        for i, (p, side) in enumerate(zip(points, sides)):
+            q, q_side = points[i - 1], sides[i - 1]
+            if side >= 0:
+                if q_side < 0:
+                    output.append(_intersection(q, p, q_side, side))
+                output.append(p)
+            elif q_side >= 0:
+                output.append(_intersection(q, p, q_side, side))
+    return np.array(output, dtype=np.float64).reshape(-1, 2)
+
+
+def _signed_area(points: list) -> float:
+    area = 0.0
+    for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1]):
+        area += x0 * y1 - x1 * y0
+    return 0.5 * area
+
+
+def _intersection(q, p, q_side, p_side):
+    t = q_side / (q_side - p_side)
+    return [q[0] + t * (p[0] - q[0]), q[1] + t * (p[1] - q[1])]
+
+
+def contains_point(polygon: np.ndarray, x: float, y: float) -> bool:
+    """Whether convex polygon contains point (x, y), boundary included."""
+    edges = np.roll(polygon, -1, axis=0) - polygon
+    cross = edges[:, 0] * (y - polygon[:, 1]) - edges[:, 1] * (x - polygon[:, 0])
+    return bool((cross >= 0).all() or (cross <= 0).all())
+
+
+# smallest grid cell in meters, footprints of frames taken on the ground must not shrink the grid
+MIN_CELL_SIZE = 1.0
+# the grid is rebuilt with larger cells when a footprint spans more cells than this per side
+MAX_CELLS_PER_SIDE = 4
+
+
+class FootprintIndex:
+    """Spatial index of frame footprints keyed by any hashable (e.g. frame name).
+
+    cell_size is in meters, by default the size of the first footprint (at
+    least MIN_CELL_SIZE), so a footprint falls in a handful of cells and
+    lookups cost O(1) on average. Cells grow with the largest footprint.
+    """
+
+    def __init__(self, fov_x: float = 1.74, cell_size: float = None, ref: tuple = None):
+        self.fov_x = fov_x
+        self.cell_size = cell_size
+        self.ref = ref
+        self.cameras = {}
+        self.footprints = {}  # key -> (polygon, bbox)
+        self.cells = {}  # (cx, cy) -> set of keys
+
+    def __len__(self):
+        return len(self.footprints)
+
+    def __contains__(self, key):
+        return key in self.footprints
+
+    def camera(self, width: int, height: int) -> CameraModel:
+        camera = self.cameras.get((width, height))
+        if camera is None:
+            camera = self.cameras[(width, height)] = CameraModel(width, height, self.fov_x)
+        return camera
+
+    def footprint(self, drone_data: DroneData, width: int, height: int):
+        """Ground polygon (4, 2) of a frame in local meters, None if it does not hit the ground.
+
+        The first call sets the reference point unless it was given.
+        """
+        if self.ref is None:
+            self.ref = (drone_data.lat, drone_data.lon)
+        corners = self.camera(width, height).footprints(
+            drone_data.roll or 0.0, drone_data.pitch or 0.0, drone_data.yaw or 0.0, drone_data.rel_alt
+        )[0]
+        if np.isnan(corners).any():
+            return None
+        east, north = geo_to_local(drone_data.lat, drone_data.lon, *self.ref)
+        return corners + (east, north)
+
+    def add_frame(self, key, drone_data: DroneData, width: int, height: int):
+        """Index the footprint of a frame, returns it (None if it was not added)."""
+        polygon = self.footprint(drone_data, width, height)
+        if polygon is not None:
+            self.insert(key, polygon)
+        return polygon
+
+    def insert(self, key, polygon: np.ndarray) -> None:
+        polygon = np.asarray(polygon, dtype=np.float64)
+        if key in self.footprints:
+            self.remove(key)
+        bbox = (*polygon.min(axis=0), *polygon.max(axis=0))
+        extent = max(bbox[2] - bbox[0], bbox[3] - bbox[1])
+        if self.cell_size is None or extent > MAX_CELLS_PER_SIDE * self.cell_size:
+            self.__regrid(max(extent, MIN_CELL_SIZE))
+        self.footprints[key] = (polygon, bbox)
+        for cell in self.__cells(bbox):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def __regrid(self, cell_size: float) -> None:
+        self.cell_size = cell_size
+        self.cells = {}
+        for key, (_, bbox) in self.footprints.items():
+            for cell in self.__cells(bbox):
+                self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key) -> None:
+        polygon, bbox = self.footprints.pop(key)
+        for cell in self.__cells(bbox):
+            keys = self.cells[cell]
+            keys.discard(key)
+            if not keys:
+                del self.cells[cell]
+
+    def __cells(self, bbox):
+        size = self.cell_size
+        for cy in range(math.floor(bbox[1] / size), math.floor(bbox[3] / size) + 1):
+            for cx in range(math.floor(bbox[0] / size), math.floor(bbox[2] / size) + 1):
+                yield cx, cy
+
+    def __candidates(self, bbox):
+        if self.cell_size is None:
+            return set()
+        candidates = set()
+        for cell in self.__cells(bbox):
+            candidates |= self.cells.get(cell, set())
+        return candidates
+
+    def query_point(self, x: float, y: float) -> list:
+        """Keys of footprints containing local point (x, y)."""
+        return [
+            key
+            for key in self.__candidates((x, y, x, y))
+            if contains_point(self.footprints[key][0], x, y)
+        ]
+
+    def query_bbox(self, x0: float, y0: float, x1: float, y1: float) -> list:
+        """Keys of footprints intersecting rectangle [x0, x1] x [y0, y1]."""
+        rect = np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype=np.float64)
+        keys = []
+        for key in self.__candidates((x0, y0, x1, y1)):
+            polygon, bbox = self.footprints[key]
+            if bbox[0] > x1 or bbox[2] < x0 or bbox[1] > y1 or bbox[3] < y0:
+                continue
+            if len(clip_polygon(polygon, rect)):
+                keys.append(key)
+        return keys
+
+    def overlaps(self, polygon: np.ndarray, min_ratio: float = 0.0) -> list:
+        """(key, ratio) of indexed footprints covering more than min_ratio of polygon area."""
+        polygon = np.asarray(polygon, dtype=np.float64)
+        area = polygon_area(polygon)
+        if area == 0:
+            return []
+        x0, y0 = polygon.min(axis=0)
+        x1, y1 = polygon.max(axis=0)
+        result = []
+        for key in self.__candidates((x0, y0, x1, y1)):
+            other, bbox = self.footprints[key]
+            if bbox[0] > x1 or bbox[2] < x0 or bbox[1] > y1 or bbox[3] < y0:
+                continue
+            ratio = polygon_area(clip_polygon(polygon, other)) / area
+            if ratio > min_ratio:
+                result.append((key, ratio))
+        return sorted(result, key=lambda item: item[1], reverse=True)
+
+    def overlap_ratio(self, polygon: np.ndarray) -> float:
+        """Largest fraction of polygon covered by a single indexed footprint."""
+        overlaps = self.overlaps(polygon)
+        return overlaps[0][1] if overlaps else 0.0
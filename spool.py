@@ -0,0 +1,247 @@
+"""Disk spool of encoded frames waiting for the link to the ground station.
+
+Frames are stored as the [header, jpeg] pair sent on the wire, appended to
+segment files of at most segment_mb. An append-only index log records every
+added frame and every frame sent from the spool, so pending frames survive a
+process restart. Segments are deleted once all their frames are sent, and the
+oldest segment is dropped when the spool would grow over max_mb.
+
+  segment_<n>.spl: 16 byte header (magic, version), records of
+                   header length, jpeg length (uint32), header, jpeg
+  index.log:       16 byte header, records of op (add/done), segment,
+                   offset, header length, jpeg length
+"""
+import collections
+import glob
+import logging
+import os
+import re
+import struct
+import threading
+
+MAGIC = b"GFSP"
+VERSION = 1
+FILE_HEADER_FORMAT = "<4sH10x"
+FILE_HEADER_SIZE = struct.calcsize(FILE_HEADER_FORMAT)
+RECORD = struct.Struct("<II")
+INDEX = struct.Struct("<BIQII")
+OP_ADD = 1
+OP_DONE = 2
+
+SPOOL_ORDERS = ("fifo", "newest")
+
+
+class FrameSpool:
+    """Bounded on-disk FIFO (or LIFO) of (header, jpeg) pairs, safe to use from several threads."""
+
+    def __init__(
+        self,
+        path: str = "data/spool",
+        max_mb: float = 1024,
+        segment_mb: float = 64,
+        order: str = "fifo",
+    ):
+        if order not in SPOOL_ORDERS:
+            raise ValueError(f"Unknown spool order {order}, use one of {SPOOL_ORDERS}")
+        self.path = path
+        self.max_bytes = int(max_mb * 2**20)
+        self.segment_bytes = int(segment_mb * 2**20)
+        self.order = order
+        self.lock = threading.Lock()
+        # (segment, offset) -> (header length, jpeg length) of pending frames
+        self.entries = {}
+        self.pending = collections.deque()  # keys in append order
+        self.segment_pending = collections.Counter()
+        self.segment_sizes = {}
+        self.appended = 0
+        self.sent = 0
+        self.evicted = 0
+        self.done_records = 0
+        os.makedirs(path, exist_ok=True)
+        self.__load()
+        self.segment = max(self.segment_sizes, default=0) + 1
+        self.segment_file = self.__open_segment(self.segment)
+        if self.entries:
+            logging.info(f"Spool {path}: resuming with {len(self.entries)} frames ({self.size_bytes() / 2**20:.1f} MB)")
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.pending)
+
+    def size_bytes(self) -> int:
+        return sum(self.segment_sizes.values())
+
+    def append(self, header, jpg_buffer) -> bool:
+        """Store one frame, returns False when it is larger than the whole spool."""
+        size = RECORD.size + len(header) + len(jpg_buffer)
+        if FILE_HEADER_SIZE + size > self.max_bytes:
+            return False
+        with self.lock:
+            if self.segment_sizes[self.segment] + size > self.segment_bytes:
+                self.__rotate()
+            while self.size_bytes() + size > self.max_bytes and self.pending:
+                self.__evict_oldest()
+            offset = self.segment_sizes[self.segment]
+            self.segment_file.write(RECORD.pack(len(header), len(jpg_buffer)))
+            self.segment_file.write(header)
+            self.segment_file.write(jpg_buffer)
+            self.segment_file.flush()
+            self.segment_sizes[self.segment] += size
+            self.__log(OP_ADD, self.segment, offset, len(header), len(jpg_buffer))
+            key = (self.segment, offset)
+            self.entries[key] = (len(header), len(jpg_buffer))
+            self.pending.append(key)
+            self.segment_pending[self.segment] += 1
+            self.appended += 1
+        return True
+
+    def peek(self):
+        """(key, header, jpeg) of the next frame to send in spool order, None when empty."""
+        with self.lock:
+            while self.pending:
+                key = self.pending[0] if self.order == "fifo" else self.pending[-1]
+                header_len, jpg_len = self.entries[key]
+                try:
+                    with open(self.__segment_path(key[0]), "rb") as f:
+                        f.seek(key[1] + RECORD.size)
+                        data = f.read(header_len + jpg_len)
+                except OSError as ex:
+                    data = b""
+                    logging.warning(f"Spool: cannot read frame {key}: {ex}")
+                if len(data) == header_len + jpg_len:
+                    return key, data[:header_len], data[header_len:]
+                logging.warning(f"Spool: frame {key} is damaged, skipping it.")
+                self.__remove(key)
+        return None
+
+    def done(self, key) -> None:
+        """Mark frame returned by peek() as sent."""
+        with self.lock:
+            if key in self.entries:
+                self.__remove(key)
+                self.sent += 1
+
+    def close(self) -> None:
+        with self.lock:
+            self.segment_file.close()
+            self.index_file.close()
+            if not self.segment_pending[self.segment]:
+                self.__delete_segment(self.segment)
+
+    def summary(self) -> str:
+        with self.lock:
+            return (
+                f"{self.appended} spooled, {self.sent} sent from spool, {self.evicted} evicted, "
+                f"{len(self.pending)} pending ({self.size_bytes() / 2**20:.1f} MB)"
+            )
+
+    def __segment_path(self, segment: int) -> str:
+        return os.path.join(self.path, f"segment_{segment:06d}.spl")
+
+    def __open_segment(self, segment: int):
+        f = open(self.__segment_path(segment), "wb")
+        f.write(struct.pack(FILE_HEADER_FORMAT, MAGIC, VERSION))
+        f.flush()
+        self.segment_sizes[segment] = FILE_HEADER_SIZE
+        return f
+
+    def __rotate(self) -> None:
+        self.segment_file.close()
+        if not self.segment_pending[self.segment]:
+            self.__delete_segment(self.segment)
+        self.segment += 1
+        self.segment_file = self.__open_segment(self.segment)
+
+    def __delete_segment(self, segment: int) -> None:
+        try:
+            os.remove(self.__segment_path(segment))
+        except FileNotFoundError:
+            pass
+        self.segment_sizes.pop(segment, None)
+        self.segment_pending.pop(segment, None)
+
+    def __evict_oldest(self) -> None:
+        oldest = min(self.segment_sizes)
+        if oldest == self.segment:
+            # everything is in the current segment, start a new one to drop it
+            self.__rotate()
+            oldest = min(self.segment_sizes)
+            if oldest == self.segment:
+                return
+        evicted = [key for key in self.pending if key[0] == oldest]
+        for key in evicted:
+            self.__remove(key)
+        self.evicted += len(evicted)
+        self.__delete_segment(oldest)
+        logging.warning(f"Spool is full ({self.max_bytes / 2**20:.0f} MB), dropped {len(evicted)} oldest frames.")
+
+    def __remove(self, key) -> None:
+        del self.entries[key]
+        if self.pending[0] == key:
+            self.pending.popleft()
+        elif self.pending[-1] == key:
+            self.pending.pop()
+        else:
+            self.pending.remove(key)
+        segment = key[0]
+        self.segment_pending[segment] -= 1
+        self.__log(OP_DONE, segment, key[1], 0, 0)
+        self.done_records += 1
+        if not self.segment_pending[segment] and segment != self.segment:
+            self.__delete_segment(segment)
+        # keep the index proportional to the pending frames
+        if self.done_records > 1000 and self.done_records > 2 * len(self.entries):
+            self.__compact_index()
+
+    def __log(self, op: int, segment: int, offset: int, header_len: int, jpg_len: int) -> None:
+        self.index_file.write(INDEX.pack(op, segment, offset, header_len, jpg_len))
+        self.index_file.flush()
+
+    def __index_path(self) -> str:
+        return os.path.join(self.path, "index.log")
+
+    def __compact_index(self) -> None:
+        self.index_file.close()
+        self.__write_index()
+
+    def __write_index(self) -> None:
+        """Replace the index with add records of the pending frames."""
+        tmp_path = self.__index_path() + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(struct.pack(FILE_HEADER_FORMAT, MAGIC, VERSION))
+            for key in self.pending:
+                f.write(INDEX.pack(OP_ADD, *key, *self.entries[key]))
+        os.replace(tmp_path, self.__index_path())
+        self.index_file = open(self.__index_path(), "ab")
+        self.done_records = 0
+
+    def __load(self) -> None:
+        """Rebuild pending frames from the index, dropping records whose data was not fully written."""
+        for path in glob.glob(os.path.join(self.path, "segment_*.spl")):
+            match = re.match(r"segment_(\d+)\.spl$", os.path.basename(path))
+            if match:
+                self.segment_sizes[int(match.group(1))] = os.path.getsize(path)
+        added = {}
+        index_path = self.__index_path()
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                header = f.read(FILE_HEADER_SIZE)
+                data = b""
+                if len(header) == FILE_HEADER_SIZE and struct.unpack(FILE_HEADER_FORMAT, header) == (MAGIC, VERSION):
+                    data = f.read()
+            for i in range(len(data) // INDEX.size):
+                op, segment, offset, header_len, jpg_len = INDEX.unpack_from(data, i * INDEX.size)
+                if op == OP_ADD:
+                    added[(segment, offset)] = (header_len, jpg_len)
+                else:
+                    added.pop((segment, offset), None)
+        for key, (header_len, jpg_len) in sorted(added.items()):
+            if key[1] + RECORD.size + header_len + jpg_len <= self.segment_sizes.get(key[0], 0):
+                self.entries[key] = (header_len, jpg_len)
+                self.pending.append(key)
+                self.segment_pending[key[0]] += 1
+        for segment in list(self.segment_sizes):
+            if not self.segment_pending[segment]:
+                self.__delete_segment(segment)
+        # start the index over with just the pending frames
+        self.__write_index()
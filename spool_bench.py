@@ -0,0 +1,136 @@
+"""Benchmark of the ImgSender disk spool.
+
+First measures raw spool write and replay throughput. Then emulates a link
+outage over tcp://127.0.0.1: ImgSender produces frames at --fps while the
+ground station stand-in is down for --outage seconds, then the receiver comes
+up and the backlog drain rate is measured until every frame has arrived.
+
+Usage:
+  python spool_bench.py --outage 5 --fps 10 --bandwidth 20
+"""
+import argparse
+import logging
+import shutil
+import tempfile
+import threading
+import time
+import cv2
+import numpy as np
+
+from geo_frame import GeorefFrame
+from image_sender import ImgSender
+from models import DroneData
+from spool import FrameSpool
+from transport import FrameTransportReceiver
+from transport_bench import load_jpeg
+from wire_format import unpack_header
+
+
+def bench_spool(path, jpg_buffer, frames):
+    spool = FrameSpool(path)
+    start = time.perf_counter()
+    for i in range(frames):
+        spool.append(f"frame_{i:05d}".encode(), jpg_buffer)
+    write_s = time.perf_counter() - start
+    start = time.perf_counter()
+    while (entry := spool.peek()) is not None:
+        spool.done(entry[0])
+    read_s = time.perf_counter() - start
+    spool.close()
+    megabytes = frames * len(jpg_buffer) / 1e6
+    return megabytes / write_s, frames / write_s, megabytes / read_s, frames / read_s
+
+
+def receive(receiver, expected, bandwidth, arrivals, stop):
+    while len(arrivals) < expected and not stop.is_set():
+        item = receiver.recv(timeout=0.1)
+        if item is None:
+            continue
+        header, jpg_buffer = item
+        if bandwidth:
+            time.sleep(len(jpg_buffer) * 8 / (bandwidth * 1e6))
+        arrivals[unpack_header(header).name] = (time.perf_counter(), len(jpg_buffer))
+        receiver.ack()
+
+
+def bench_outage(path, image, args):
+    port = f"tcp://127.0.0.1:{args.port}"
+    sender = ImgSender(
+        jpeg_quality=80,
+        address=port,
+        max_queue_size=10,
+        transport=args.transport,
+        ack_timeout=args.ack_timeout,
+        spool={"path": path, "retry_interval": args.retry_interval},
+    )
+    expected = int(args.fps * (args.outage + args.after))
+    arrivals, stop = {}, threading.Event()
+    start = time.perf_counter()
+    receiver_thread = None
+    for i in range(expected):
+        delay = start + i / args.fps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        if receiver_thread is None and time.perf_counter() - start >= args.outage:
+            link_up = time.perf_counter()
+            # frames captured during the outage form the backlog
+            backlog_frames = i
+            receiver = FrameTransportReceiver(open_port=port, mode=args.transport)
+            receiver_thread = threading.Thread(target=receive, args=(receiver, expected, args.bandwidth, arrivals, stop))
+            receiver_thread.start()
+        sender.add_frame_to_send(GeorefFrame(image, DroneData(), f"frame_{i:05d}"))
+    deadline = time.perf_counter() + args.timeout
+    while len(arrivals) < expected and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    receiver_thread.join()
+    sender.stop()
+    receiver.close()
+    backlog = [(t, size) for name, (t, size) in arrivals.items() if int(name[6:]) < backlog_frames]
+    drain_s = max(t for t, _ in backlog) - link_up if backlog else 0.0
+    drained_mb = sum(size for _, size in backlog) / 1e6
+    return backlog_frames, sender.spool.appended, len(arrivals), expected, drain_s, drained_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ImgSender disk spool benchmark")
+    parser.add_argument("-n", type=int, default=500, help="Frames for the raw spool measurement")
+    parser.add_argument("--outage", type=float, default=5, help="Seconds the ground station is down")
+    parser.add_argument("--after", type=float, default=5, help="Seconds frames keep coming after the link is back")
+    parser.add_argument("--fps", type=float, default=10, help="Rate of frames to send")
+    parser.add_argument("--bandwidth", type=float, default=0, help="Emulated link Mbit/s, 0 - unlimited")
+    parser.add_argument("--transport", default="dealer", help="reqrep, dealer or push")
+    parser.add_argument("--ack-timeout", type=float, default=1.0)
+    parser.add_argument("--retry-interval", type=float, default=0.5)
+    parser.add_argument("--timeout", type=float, default=60, help="Give up waiting for the backlog after seconds")
+    parser.add_argument("--samples", default="map_visualization/samples")
+    parser.add_argument("--port", type=int, default=5791)
+    parser.add_argument("-l", "--log-level", default="WARNING")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s: %(message)s")
+
+    jpg_buffer = load_jpeg(args.samples)
+    image = cv2.imdecode(np.frombuffer(jpg_buffer, np.uint8), cv2.IMREAD_COLOR)
+    path = tempfile.mkdtemp(prefix="spool_bench_")
+    try:
+        write_mb, write_fps, read_mb, read_fps = bench_spool(path, jpg_buffer, args.n)
+        print(f"720p JPEG {len(jpg_buffer) / 1024:.0f} KiB")
+        print(f"spool write : {write_mb:7.1f} MB/s {write_fps:7.1f} frames/s")
+        print(f"spool replay: {read_mb:7.1f} MB/s {read_fps:7.1f} frames/s")
+        backlog, spooled, received, expected, drain_s, drained_mb = bench_outage(path, image, args)
+        print(
+            f"outage of {args.outage}s at {args.fps} fps over {args.transport}, "
+            f"bandwidth {args.bandwidth or 'unlimited'} Mbit/s: {backlog} frames captured during outage, "
+            f"{spooled} spooled, {received}/{expected} received"
+        )
+        if drain_s:
+            print(
+                f"backlog drained in {drain_s:.2f}s: {backlog / drain_s:.1f} frames/s, "
+                f"{drained_mb / drain_s:.1f} MB/s while live frames kept coming"
+            )
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import math
+import time
+import numpy as np
+from models import DroneData
+
+
+class TimeSeries:
+    """Fixed capacity, array backed ring of timestamped samples.
+
+    Single writer (MAVLink thread), readers never take a lock: the sample count is
+    published after the row is written and readers retry if the writer wrapped
+    around over the rows they used.
+    """
+
+    def __init__(self, capacity: int, columns: int):
+        self.capacity = capacity
+        self.boot_times = np.zeros(capacity, dtype=np.float64)
+        self.arrival_times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, columns), dtype=np.float64)
+        self.count = 0
+
+    def append(self, boot_time: float, arrival_time: float, values) -> None:
+        i = self.count % self.capacity
+        self.values[i] = values
+        self.boot_times[i] = boot_time
+        self.arrival_times[i] = arrival_time
+        self.count += 1
+
+    def clear(self) -> None:
+        self.count = 0
+
+    def last_boot_time(self):
+        count = self.count
+        if count == 0:
+            return None
+        return self.boot_times[(count - 1) % self.capacity]
+
+    def bracket(self, t: float):
+        """Find samples around boot time t in O(log n).
+
+        Returns (values_before, values_after, fraction), with both sides equal when
+        t is outside of the buffered range. None when the series is empty.
+        """
+        while True:
+            count = self.count
+            if count == 0:
+                return None
+            # skip the oldest row, the writer may be overwriting it right now
+            lo = max(0, count - self.capacity + 1)
+            hi = count - 1
+            cap = self.capacity
+            if t <= self.boot_times[lo % cap]:
+                before = after = lo
+            elif t >= self.boot_times[hi % cap]:
+                before = after = hi
+            else:
+                # invariant: boot_times[lo] < t <= boot_times[hi]
+                while hi - lo > 1:
+                    mid = (lo + hi) // 2
+                    if self.boot_times[mid % cap] < t:
+                        lo = mid
+                    else:
+                        hi = mid
+                before, after = lo, hi
+            v0 = self.values[before % cap].copy()
+            v1 = self.values[after % cap].copy()
+            t0 = self.boot_times[before % cap]
+            t1 = self.boot_times[after % cap]
+            if self.count - cap >= before:
+                continue  # overwritten while reading, retry
+            frac = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+            return v0, v1, frac
+
+
+def euler_to_quaternion(roll, pitch, yaw):
+    cr, sr = math.cos(roll / 2), math.sin(roll / 2)
+    cp, sp = math.cos(pitch / 2), math.sin(pitch / 2)
+    cy, sy = math.cos(yaw / 2), math.sin(yaw / 2)
+    return np.array(
+        [
+            cr * cp * cy + sr * sp * sy,
+            sr * cp * cy - cr * sp * sy,
+            cr * sp * cy + sr * cp * sy,
+            cr * cp * sy - sr * sp * cy,
+        ]
+    )
+
+
+def quaternion_to_euler(q):
+    w, x, y, z = q
+    roll = math.atan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+    pitch = math.asin(max(-1.0, min(1.0, 2 * (w * y - z * x))))
+    yaw = math.atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+    return roll, pitch, yaw
+
+
+def slerp(q0, q1, frac):
+    dot = float(np.dot(q0, q1))
+    if dot < 0.0:
+        q1 = -q1
+        dot = -dot
+    if dot > 0.9995:
+        q = q0 + frac * (q1 - q0)
+        return q / np.linalg.norm(q)
+    theta = math.acos(dot)
+    sin_theta = math.sin(theta)
+    return (
+        math.sin((1 - frac) * theta) * q0 + math.sin(frac * theta) * q1
+    ) / sin_theta
+
+
+class TelemetryBuffer:
+    """Timestamped position and attitude history with interpolated lookups.
+
+    Samples are stamped with autopilot time_boot_ms and local monotonic arrival
+    time. The boot clock is mapped to the monotonic clock with the smallest seen
+    arrival delay, so frame timestamps (monotonic) can be looked up in the boot
+    clock where samples are evenly spaced and free of transport jitter.
+    """
+
+    def __init__(self, capacity: int = 2048):
+        self.position = TimeSeries(capacity, 4)  # lat, lon, alt, rel_alt
+        self.attitude = TimeSeries(capacity, 3)  # roll, pitch, yaw
+        self.clock_offset = None  # monotonic - boot time
+
+    def __add(self, series: TimeSeries, time_boot_ms: int, values, arrival_time=None):
+        if arrival_time is None:
+            arrival_time = time.monotonic()
+        boot_time = time_boot_ms / 1000.0
+        last = series.last_boot_time()
+        if last is not None and boot_time < last - 1.0:
+            # autopilot rebooted, old samples are in a different clock
+            self.position.clear()
+            self.attitude.clear()
+            self.clock_offset = None
+        offset = arrival_time - boot_time
+        if self.clock_offset is None or offset < self.clock_offset:
+            self.clock_offset = offset
+        series.append(boot_time, arrival_time, values)
+
+    def add_position(self, time_boot_ms, lat, lon, alt, rel_alt, arrival_time=None):
+        self.__add(self.position, time_boot_ms, (lat, lon, alt, rel_alt), arrival_time)
+
+    def add_attitude(self, time_boot_ms, roll, pitch, yaw, arrival_time=None):
+        self.__add(self.attitude, time_boot_ms, (roll, pitch, yaw), arrival_time)
+
+    def is_ready(self) -> bool:
+        return self.position.count > 0 and self.attitude.count > 0
+
+    def sample(self, timestamp: float = None):
+        """Interpolated DroneData at monotonic timestamp (now by default), None until ready."""
+        offset = self.clock_offset
+        if not self.is_ready() or offset is None:
+            return None
+        if timestamp is None:
+            timestamp = time.monotonic()
+        t = timestamp - offset
+        position = self.position.bracket(t)
+        attitude = self.attitude.bracket(t)
+        if position is None or attitude is None:
+            return None
+        p0, p1, frac = position
+        lat, lon, alt, rel_alt = p0 + frac * (p1 - p0)
+        a0, a1, frac = attitude
+        q = slerp(euler_to_quaternion(*a0), euler_to_quaternion(*a1), frac)
+        roll, pitch, yaw = quaternion_to_euler(q)
+        return DroneData(
+            lat=float(lat),
+            lon=float(lon),
+            alt=float(alt),
+            rel_alt=float(rel_alt),
+            roll=round(roll, 5),
+            pitch=round(pitch, 5),
+            yaw=round(yaw, 5),
+        )
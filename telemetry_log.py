@@ -0,0 +1,120 @@
+"""Streaming binary telemetry log, one fixed-size record per written video frame.
+
+File layout: 16 byte header (magic, version, record size) followed by packed
+records, so the log can be appended during flight and memory-mapped later.
+
+Convert to the YAML format used before:
+  python telemetry_log.py data/<session>/telemetry.bin -o telemetry.yaml
+"""
+import argparse
+import logging
+import os
+import struct
+import time
+import numpy as np
+import yaml
+
+from models import DroneData
+
+MAGIC = b"MTLG"
+VERSION = 1
+HEADER_FORMAT = "<4sHH8x"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+RECORD_DTYPE = np.dtype(
+    [
+        ("frame", "<u4"),
+        ("timestamp", "<f8"),
+        ("lat", "<f8"),
+        ("lon", "<f8"),
+        ("alt", "<f4"),
+        ("rel_alt", "<f4"),
+        ("roll", "<f4"),
+        ("pitch", "<f4"),
+        ("yaw", "<f4"),
+    ]
+)
+DRONE_FIELDS = ("lat", "lon", "alt", "rel_alt", "roll", "pitch", "yaw")
+# precision of the MAVLink source values, float32 columns are rounded back to it on export
+FIELD_DECIMALS = {"lat": 7, "lon": 7, "alt": 3, "rel_alt": 3, "roll": 5, "pitch": 5, "yaw": 5}
+
+
+class TelemetryLogWriter:
+    """Buffers records in a preallocated array and appends them to file periodically."""
+
+    def __init__(self, path: str, chunk_size: int = 256, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.buffer = np.zeros(chunk_size, dtype=RECORD_DTYPE)
+        self.buffered = 0
+        self.count = 0
+        self.last_flush = time.monotonic()
+        self.file = open(path, "wb")
+        self.file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, RECORD_DTYPE.itemsize))
+
+    def append(self, frame: int, timestamp: float, drone_data: DroneData = None) -> None:
+        record = self.buffer[self.buffered]
+        record["frame"] = frame
+        record["timestamp"] = timestamp if timestamp is not None else np.nan
+        for field in DRONE_FIELDS:
+            value = getattr(drone_data, field) if drone_data is not None else None
+            record[field] = value if value is not None else np.nan
+        self.buffered += 1
+        self.count += 1
+        if (
+            self.buffered == len(self.buffer)
+            or time.monotonic() - self.last_flush > self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        if self.buffered:
+            self.file.write(self.buffer[: self.buffered].tobytes())
+            self.buffered = 0
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+
+def read_telemetry_log(path: str) -> np.ndarray:
+    """Memory-map telemetry log as a structured array, a partially written last record is ignored."""
+    with open(path, "rb") as f:
+        magic, version, record_size = struct.unpack(HEADER_FORMAT, f.read(HEADER_SIZE))
+    if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} is not a telemetry log version {VERSION}")
+    count = (os.path.getsize(path) - HEADER_SIZE) // record_size
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+def record_to_dict(record) -> dict:
+    """Telemetry record as DroneData fields dict, as saved to telemetry.yaml before."""
+    return {
+        field: (
+            None
+            if np.isnan(record[field])
+            else round(float(record[field]), FIELD_DECIMALS[field])
+        )
+        for field in DRONE_FIELDS
+    }
+
+
+def export_yaml(log_path: str, yaml_path: str) -> int:
+    records = read_telemetry_log(log_path)
+    with open(yaml_path, "w") as f:
+        yaml.dump([record_to_dict(r) for r in records], f)
+    return len(records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert binary telemetry log to YAML")
+    parser.add_argument("log", help="telemetry.bin file")
+    parser.add_argument("-o", "--output", default=None, help="YAML output (default: next to the log)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+    output = args.output or os.path.splitext(args.log)[0] + ".yaml"
+    count = export_yaml(args.log, output)
+    logging.info(f"Exported {count} telemetry records to {output}")
@@ -0,0 +1,175 @@
+"""Region-of-interest tiling of frames sent to the ground station.
+
+Consecutive selected frames overlap heavily, with tiling ImgSender sends only
+the grid tiles of a frame that show ground not covered by recently sent
+frames. Tile ground positions come from the camera pose in DroneData
+(projection), coverage from a FootprintIndex of the sent frames.
+
+Sent tiles are packed into one atlas JPEG, the wire header carries the tile
+size, grid and a row-major bitmask of the sent tiles. The GCS puts them back
+in place (reassemble) as a BGRA frame with transparent missing tiles, which
+the mosaic skips. Tile sizes are multiples of 16 pixels so tiles line up with
+JPEG blocks and do not bleed into each other in the atlas.
+"""
+import collections
+import math
+import numpy as np
+from models import DroneData
+from projection import geo_to_local
+from spatial_index import FootprintIndex
+
+# bits of the tile mask in the wire header
+MAX_TILES = 64
+TILE_ALIGN = 16
+
+
+def tile_grid(width: int, height: int, tile_size: int) -> tuple:
+    """(tile_size, cols, rows) covering the frame, tiles grow until there are at most MAX_TILES."""
+    tile_size = max(TILE_ALIGN, tile_size // TILE_ALIGN * TILE_ALIGN)
+    while math.ceil(width / tile_size) * math.ceil(height / tile_size) > MAX_TILES:
+        tile_size += TILE_ALIGN
+    return tile_size, math.ceil(width / tile_size), math.ceil(height / tile_size)
+
+
+def mask_indices(mask: int) -> list:
+    """Row-major indices of the tiles set in mask."""
+    return [i for i in range(MAX_TILES) if mask >> i & 1]
+
+
+def atlas_shape(count: int, cols: int) -> tuple:
+    """(atlas cols, atlas rows) in tiles of an atlas of count tiles from a grid cols wide."""
+    atlas_cols = min(count, cols)
+    return atlas_cols, math.ceil(count / atlas_cols)
+
+
+def pack_tiles(image: np.ndarray, tiles: dict) -> np.ndarray:
+    """Atlas of the image tiles set in tiles["mask"], in row-major order."""
+    size, cols = tiles["size"], tiles["cols"]
+    indices = mask_indices(tiles["mask"])
+    atlas_cols, atlas_rows = atlas_shape(len(indices), cols)
+    atlas = np.zeros((atlas_rows * size, atlas_cols * size) + image.shape[2:], dtype=image.dtype)
+    for slot, index in enumerate(indices):
+        row, col = divmod(index, cols)
+        # edge tiles may be cut by the frame border
+        src = image[row * size : (row + 1) * size, col * size : (col + 1) * size]
+        y, x = slot // atlas_cols * size, slot % atlas_cols * size
+        atlas[y : y + src.shape[0], x : x + src.shape[1]] = src
+    return atlas
+
+
+def reassemble(atlas: np.ndarray, tiles: dict, width: int, height: int) -> np.ndarray:
+    """BGRA frame from a decoded BGR atlas, pixels of tiles not sent are transparent."""
+    size, cols = tiles["size"], tiles["cols"]
+    frame = np.zeros((height, width, 4), dtype=np.uint8)
+    indices = mask_indices(tiles["mask"])
+    atlas_cols, _ = atlas_shape(len(indices), cols)
+    for slot, index in enumerate(indices):
+        row, col = divmod(index, cols)
+        dst = frame[row * size : (row + 1) * size, col * size : (col + 1) * size]
+        y, x = slot // atlas_cols * size, slot % atlas_cols * size
+        h, w = dst.shape[:2]
+        dst[:, :, :3] = atlas[y : y + h, x : x + w]
+        dst[:, :, 3] = 255
+    return frame
+
+
+class TileSelector:
+    """Chooses which tiles of a frame carry new ground coverage.
+
+    A tile is covered when one of the last history sent footprints contains
+    all its corners. Every keyframe_interval-th frame and frames with more
+    than max_new_fraction new tiles are sent whole.
+    """
+
+    def __init__(
+        self,
+        fov_x: float = 1.74,
+        tile_size: int = 160,
+        history: int = 30,
+        keyframe_interval: int = 10,
+        max_new_fraction: float = 0.75,
+    ):
+        self.tile_size = tile_size
+        self.history = history
+        self.keyframe_interval = keyframe_interval
+        self.max_new_fraction = max_new_fraction
+        self.index = FootprintIndex(fov_x)
+        self.sent = collections.deque()  # keys of indexed footprints, oldest first
+        self.next_key = 0
+        self.considered = 0
+        self.stats = collections.Counter()  # full, tiled, skipped frames and sent / total tiles
+
+    def select(self, drone_data: DroneData, width: int, height: int):
+        """(tiles, footprint) for a frame about to be sent.
+
+        tiles is None to send the whole frame, otherwise a dict with tile size,
+        cols, rows and the mask of tiles to send (0 - nothing new, skip the
+        frame). Pass footprint to commit() once the frame is sent.
+        """
+        if drone_data.lat is None or drone_data.lon is None or not drone_data.rel_alt:
+            return None, None
+        footprint = self.index.footprint(drone_data, width, height)
+        if footprint is None:
+            return None, None
+        self.considered += 1
+        size, cols, rows = tile_grid(width, height, self.tile_size)
+        if self.keyframe_interval and (self.considered - 1) % self.keyframe_interval == 0:
+            self.__count(None, cols * rows)
+            return None, footprint
+        covered = self.__covered_tiles(drone_data, width, height, size, cols, rows, footprint)
+        new = np.flatnonzero(~covered.ravel())
+        if len(new) > self.max_new_fraction * cols * rows:
+            self.__count(None, cols * rows)
+            return None, footprint
+        tiles = {"size": size, "cols": cols, "rows": rows, "mask": sum(1 << int(i) for i in new)}
+        self.__count(tiles, cols * rows)
+        return tiles, footprint
+
+    def commit(self, footprint: np.ndarray) -> None:
+        """Record footprint of a sent frame as covered ground."""
+        if footprint is None:
+            return
+        self.index.insert(self.next_key, footprint)
+        self.sent.append(self.next_key)
+        self.next_key += 1
+        while len(self.sent) > self.history:
+            self.index.remove(self.sent.popleft())
+
+    def summary(self) -> str:
+        s = self.stats
+        sent = 100 * s["tiles_sent"] / max(s["tiles"], 1)
+        return f"{s['full']} full, {s['tiled']} tiled, {s['skipped']} skipped frames, {sent:.0f}% of tiles sent"
+
+    def __count(self, tiles, count):
+        sent = count if tiles is None else len(mask_indices(tiles["mask"]))
+        self.stats["full" if tiles is None else "tiled" if sent else "skipped"] += 1
+        self.stats["tiles"] += count
+        self.stats["tiles_sent"] += sent
+
+    def __covered_tiles(self, drone_data, width, height, size, cols, rows, footprint) -> np.ndarray:
+        """(rows, cols) bool, tiles inside one of the sent footprints."""
+        x0, y0 = footprint.min(axis=0)
+        x1, y1 = footprint.max(axis=0)
+        keys = self.index.query_bbox(x0, y0, x1, y1)
+        covered = np.zeros((rows, cols), dtype=bool)
+        if not keys:
+            return covered
+        # ground position of the tile grid corners
+        xs = np.minimum(np.arange(cols + 1) * size, width)
+        ys = np.minimum(np.arange(rows + 1) * size, height)
+        gx, gy = np.meshgrid(xs, ys)
+        pixels = np.stack((gx.ravel(), gy.ravel(), np.ones(gx.size)))
+        homography = self.index.camera(width, height).ground_homography(
+            drone_data.roll or 0.0, drone_data.pitch or 0.0, drone_data.yaw or 0.0, drone_data.rel_alt
+        )
+        ground = homography @ pixels
+        east, north = geo_to_local(drone_data.lat, drone_data.lon, *self.index.ref)
+        px = ground[0] / ground[2] + east
+        py = ground[1] / ground[2] + north
+        for key in keys:
+            polygon = self.index.footprints[key][0]
+            edges = np.roll(polygon, -1, axis=0) - polygon
+            cross = edges[:, :1] * (py - polygon[:, 1:]) - edges[:, 1:] * (px - polygon[:, :1])
+            inside = ((cross >= 0).all(axis=0) | (cross <= 0).all(axis=0)).reshape(rows + 1, cols + 1)
+            covered |= inside[:-1, :-1] & inside[:-1, 1:] & inside[1:, :-1] & inside[1:, 1:]
+        return covered
@@ -0,0 +1,102 @@
+"""Benchmark of ROI tiling on the sample flight.
+
+Sends the georeferenced sample frames in flight order through TileSelector
+and compares bytes on the link with full frames and with tiled frames. With
+--mosaic both streams are also mapped the way the GCS does it, to compare
+the mapped area and how much map area every transmitted megabyte brings.
+
+Usage:
+  python tiling_bench.py --tile-size 160 --quality 80 --mosaic
+"""
+import argparse
+import glob
+import os
+import re
+import time
+import cv2
+import simplejpeg
+
+from map_visualization.batch_mosaic import read_frame_info
+from map_visualization.mosaic import Mosaic
+from models import DroneData
+from tiling import TileSelector, pack_tiles, reassemble
+
+
+def flight_order(path):
+    numbers = re.findall(r"\d+", os.path.basename(path))
+    return (int(numbers[-1]) if numbers else 0, path)
+
+
+def mapped_area(mosaic) -> float:
+    """Mapped ground area in m2."""
+    opaque = sum(cv2.countNonZero(tile[:, :, 3]) for tile in (mosaic.store.get_tile(k) for k in mosaic.store.keys()))
+    return opaque * mosaic.gsd**2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ROI tiling benchmark")
+    parser.add_argument("--samples", default="map_visualization/samples", help="Folder with georeferenced JPEGs")
+    parser.add_argument("--tile-size", type=int, default=160)
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--keyframe-interval", type=int, default=10)
+    parser.add_argument("--history", type=int, default=30)
+    parser.add_argument("--fov", type=float, default=1.74, help="Horizontal field of view in radians")
+    parser.add_argument("--mosaic", action="store_true", help="Map both streams and compare mapped area")
+    args = parser.parse_args()
+
+    infos = [read_frame_info(p) for p in sorted(glob.glob(os.path.join(args.samples, "*.jpg")), key=flight_order)]
+    infos = [info for info in infos if info is not None]
+    selector = TileSelector(
+        args.fov, args.tile_size, history=args.history, keyframe_interval=args.keyframe_interval
+    )
+    full_bytes = tiled_bytes = 0
+    select_time = encode_time = 0.0
+    full_map = Mosaic(fov_x=args.fov) if args.mosaic else None
+    tiled_map = Mosaic(fov_x=args.fov) if args.mosaic else None
+    for path, width, height, lat, lon, rel_alt, yaw in infos:
+        image = cv2.imread(path)
+        drone_data = DroneData(lat, lon, rel_alt, rel_alt, 0.0, 0.0, yaw)
+        full = simplejpeg.encode_jpeg(image, quality=args.quality, colorspace="BGR")
+        full_bytes += len(full)
+        start = time.perf_counter()
+        tiles, footprint = selector.select(drone_data, width, height)
+        select_time += time.perf_counter() - start
+        sent_image = image
+        if tiles is None:
+            tiled_bytes += len(full)
+        elif tiles["mask"]:
+            start = time.perf_counter()
+            atlas = simplejpeg.encode_jpeg(pack_tiles(image, tiles), quality=args.quality, colorspace="BGR")
+            encode_time += time.perf_counter() - start
+            tiled_bytes += len(atlas)
+            decoded = simplejpeg.decode_jpeg(atlas, colorspace="BGR")
+            sent_image = reassemble(decoded, tiles, width, height)
+        else:
+            sent_image = None
+        if tiles is None or tiles["mask"]:
+            selector.commit(footprint)
+        if args.mosaic:
+            full_map.add_frame(simplejpeg.decode_jpeg(full, colorspace="BGR"), lat, lon, rel_alt, yaw)
+            if sent_image is not None:
+                tiled_map.add_frame(sent_image, lat, lon, rel_alt, yaw)
+
+    count = len(infos)
+    print(f"{count} frames, tile size {args.tile_size}, quality {args.quality}")
+    print(f"tiling: {selector.summary()}")
+    print(f"full frames : {full_bytes / 1e6:7.2f} MB")
+    print(f"tiled frames: {tiled_bytes / 1e6:7.2f} MB ({100 * tiled_bytes / full_bytes:.0f}%)")
+    print(
+        f"tile selection {1000 * select_time / count:.2f} ms/frame, "
+        f"atlas encoding {1000 * encode_time / max(selector.stats['tiled'], 1):.2f} ms/tiled frame"
+    )
+    if args.mosaic:
+        full_area, tiled_area = mapped_area(full_map), mapped_area(tiled_map)
+        print(f"mapped area full {full_area:9.0f} m2, tiled {tiled_area:9.0f} m2 ({100 * tiled_area / full_area:.1f}%)")
+        print(
+            f"map area per MB sent: full {full_area / (full_bytes / 1e6):7.0f} m2, "
+            f"tiled {tiled_area / (tiled_bytes / 1e6):7.0f} m2"
+        )
+
+
+if __name__ == "__main__":
+    main()
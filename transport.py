@@ -0,0 +1,207 @@
+import logging
+import struct
+import time
+import zmq
+
+# Frames are [header, jpeg] multipart messages, header as packed by wire_format.
+# reqrep - REQ/REP, one frame in flight
+# dealer - DEALER/ROUTER, up to max_in_flight frames waiting for acks
+# push   - PUSH/PULL, no acks, bounded only by ZMQ high-water marks
+TRANSPORT_MODES = ("reqrep", "dealer", "push")
+
+FRAME_ID_FORMAT = "<Q"
+
+
+class FrameTransportSender:
+    """Sends (header, JPEG) pairs to the ground station using selected transport mode."""
+
+    def __init__(
+        self,
+        address: str,
+        mode: str = "dealer",
+        max_in_flight: int = 4,
+        send_hwm: int = 10,
+        ack_timeout: float = 5.0,
+        zero_copy: bool = True,
+        keep_unacked: bool = False,
+    ):
+        if mode not in TRANSPORT_MODES:
+            raise ValueError(f"Unknown transport mode {mode}, use one of {TRANSPORT_MODES}")
+        self.mode = mode
+        # with keep_unacked frames whose acks expire are collected for take_unacked() and
+        # messages are only queued to connected peers, so none are parked in ZMQ during outages
+        self.keep_unacked = keep_unacked
+        self.unacked = []
+        self.in_flight_frames = {}  # frame id -> (header, jpeg) with keep_unacked
+        # zero-copy sends hand JPEG buffers to ZMQ as they are, the encoders return immutable bytes
+        # so nothing can change them while ZMQ still reads them and sends are not tracked
+        self.zero_copy = zero_copy
+        self.max_in_flight = max_in_flight if mode == "dealer" else 1
+        self.ack_timeout = ack_timeout
+        self.in_flight = {}  # frame id -> send time
+        self.next_frame_id = 0
+        self.lost_acks = 0
+        self.last_rtt = None
+        self.address = address
+        self.send_hwm = send_hwm
+        self.socket = self.__connect()
+
+    def __connect(self) -> zmq.Socket:
+        socket = zmq.Context.instance().socket(
+            {"reqrep": zmq.REQ, "dealer": zmq.DEALER, "push": zmq.PUSH}[self.mode]
+        )
+        socket.setsockopt(zmq.SNDHWM, self.send_hwm)
+        socket.setsockopt(zmq.SNDTIMEO, int(self.ack_timeout * 1000))
+        socket.setsockopt(zmq.LINGER, 0)
+        if self.keep_unacked:
+            socket.setsockopt(zmq.IMMEDIATE, 1)
+        if self.zero_copy:
+            # pyzmq copies buffers below copy_threshold (64 KiB) even with copy=False, small JPEGs too
+            socket.copy_threshold = 0
+        socket.connect(self.address)
+        return socket
+
+    def send(self, header, jpg_buffer):
+        """Send one frame, raises zmq.Again when it could not be sent or acked in ack_timeout.
+
+        With zero_copy jpg_buffer must not be modified after the call.
+        """
+        if self.mode == "reqrep":
+            start = time.perf_counter()
+            self.__send([header, jpg_buffer])
+            if not self.socket.poll(int(self.ack_timeout * 1000), zmq.POLLIN):
+                # a REQ socket without reply cannot send again, start over with a new one
+                self.socket.close(linger=0)
+                self.socket = self.__connect()
+                self.lost_acks += 1
+                raise zmq.Again(f"No reply in {self.ack_timeout}s")
+            self.socket.recv()
+            self.last_rtt = time.perf_counter() - start
+            return
+        if self.mode == "push":
+            self.__send([header, jpg_buffer])
+            return
+        while len(self.in_flight) >= self.max_in_flight:
+            if not self.poll_acks(self.ack_timeout):
+                self.__expire_acks()
+        frame_id = self.next_frame_id
+        self.next_frame_id += 1
+        self.__send([struct.pack(FRAME_ID_FORMAT, frame_id), header, jpg_buffer])
+        self.in_flight[frame_id] = time.perf_counter()
+        if self.keep_unacked:
+            self.in_flight_frames[frame_id] = (header, jpg_buffer)
+        self.poll_acks(0)
+
+    def __send(self, parts: list) -> None:
+        if not self.zero_copy:
+            self.socket.send_multipart(parts)
+            return
+        # frame id and header are a few bytes and copied, only the JPEG is handed over
+        for part in parts[:-1]:
+            self.socket.send(part, zmq.SNDMORE)
+        self.socket.send(parts[-1], copy=False)
+
+    def poll_acks(self, timeout: float) -> bool:
+        """Collect acks of in-flight frames, returns True if any arrived."""
+        received = False
+        while self.in_flight and self.socket.poll(int(timeout * 1000), zmq.POLLIN):
+            (frame_id,) = struct.unpack(FRAME_ID_FORMAT, self.socket.recv())
+            sent = self.in_flight.pop(frame_id, None)
+            self.in_flight_frames.pop(frame_id, None)
+            if sent is not None:
+                self.last_rtt = time.perf_counter() - sent
+            received = True
+            timeout = 0
+        return received
+
+    def collect_acks(self) -> None:
+        """Collect arrived acks and give up on expired ones, for use while not sending."""
+        if self.in_flight:
+            self.poll_acks(0)
+            self.__expire_acks()
+
+    def __expire_acks(self) -> None:
+        now = time.perf_counter()
+        expired = [i for i, sent in self.in_flight.items() if now - sent > self.ack_timeout]
+        for frame_id in expired:
+            del self.in_flight[frame_id]
+            if frame_id in self.in_flight_frames:
+                self.unacked.append(self.in_flight_frames.pop(frame_id))
+        if expired:
+            self.lost_acks += len(expired)
+            logging.warning(f"No ack for {len(expired)} frames in {self.ack_timeout}s, assuming lost.")
+
+    def take_unacked(self, in_flight: bool = False) -> list:
+        """(header, jpeg) of frames whose acks expired, with in_flight also of those still waiting."""
+        if in_flight:
+            self.unacked += self.in_flight_frames.values()
+            self.in_flight_frames.clear()
+            self.in_flight.clear()
+        unacked, self.unacked = self.unacked, []
+        return unacked
+
+    def close(self) -> None:
+        self.socket.close(linger=0)
+
+
+class FrameTransportReceiver:
+    """Ground station side of FrameTransportSender, bound on open_port."""
+
+    def __init__(
+        self,
+        open_port: str = "tcp://*:5001",
+        mode: str = "dealer",
+        recv_hwm: int = 10,
+        zero_copy: bool = True,
+    ):
+        if mode not in TRANSPORT_MODES:
+            raise ValueError(f"Unknown transport mode {mode}, use one of {TRANSPORT_MODES}")
+        self.mode = mode
+        # zero-copy receives return memoryviews of the ZMQ messages instead of bytes copies
+        self.zero_copy = zero_copy
+        self.pending_ack = None
+        self.socket = zmq.Context.instance().socket(
+            {"reqrep": zmq.REP, "dealer": zmq.ROUTER, "push": zmq.PULL}[mode]
+        )
+        self.socket.setsockopt(zmq.RCVHWM, recv_hwm)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(open_port)
+
+    def recv(self, timeout: float = None):
+        """Receive next (header, jpg_buffer), None on timeout. Call ack() once handled.
+
+        With zero_copy both are memoryviews keeping the received message alive.
+        """
+        if timeout is not None and not self.socket.poll(int(timeout * 1000), zmq.POLLIN):
+            return None
+        try:
+            # a sender with another mode looks readable but its messages are dropped, do not wait for them
+            parts = self.socket.recv_multipart(zmq.NOBLOCK if timeout is not None else 0, copy=not self.zero_copy)
+        except zmq.Again:
+            return None
+        if len(parts) != (4 if self.mode == "dealer" else 2):
+            logging.warning(f"Dropping message of {len(parts)} parts, is the sender using transport {self.mode}?")
+            return None
+        if self.zero_copy:
+            # identity and frame id frames go back as they are in the ack
+            parts = parts[:-2] + [part.buffer for part in parts[-2:]]
+        if self.mode == "dealer":
+            identity, frame_id, header, jpg_buffer = parts
+            if len(frame_id) != struct.calcsize(FRAME_ID_FORMAT):
+                # a REQ sender puts an empty delimiter there and would never see the ack
+                logging.warning("Dropping message without frame id, is the sender using transport reqrep?")
+                return None
+            self.pending_ack = [identity, frame_id]
+        else:
+            header, jpg_buffer = parts
+            if self.mode == "reqrep":
+                self.pending_ack = [b"OK"]
+        return header, jpg_buffer
+
+    def ack(self) -> None:
+        if self.pending_ack is not None:
+            self.socket.send_multipart(self.pending_ack)
+            self.pending_ack = None
+
+    def close(self) -> None:
+        self.socket.close(linger=0)
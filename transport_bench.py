@@ -0,0 +1,113 @@
+"""Loopback benchmark of ImgSender transport modes.
+
+Sender and receiver run in one process over tcp://127.0.0.1. Frames are produced
+at --fps, latency is measured from frame production to its arrival. The radio
+link is emulated on the receiving side: every frame takes size / bandwidth to
+arrive and acks are delayed by the round trip time.
+
+Usage:
+  python transport_bench.py -n 100 --rtt 50 --bandwidth 2
+"""
+import argparse
+import glob
+import threading
+import time
+import cv2
+import numpy as np
+import simplejpeg
+
+from geo_frame import GeorefFrame
+from models import DroneData
+from transport import FrameTransportReceiver, FrameTransportSender, TRANSPORT_MODES
+from wire_format import pack_header, unpack_header
+
+
+def load_jpeg(samples_dir, width=1280, height=720, quality=80):
+    samples = sorted(glob.glob(f"{samples_dir}/*.jpg"))
+    if samples:
+        frame = cv2.resize(cv2.imread(samples[0]), (width, height))
+    else:
+        frame = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    return simplejpeg.encode_jpeg(frame, quality=quality, colorspace="BGR")
+
+
+def receiver_loop(receiver, frames, rtt, bandwidth, latencies, done):
+    pending_acks = []  # (due time, ack) for pipelined modes
+    while len(latencies) < frames:
+        timeout = 0.05
+        if pending_acks:
+            timeout = max(0.0, min(timeout, pending_acks[0][0] - time.perf_counter()))
+        item = receiver.recv(timeout=timeout)
+        now = time.perf_counter()
+        while pending_acks and pending_acks[0][0] <= now:
+            receiver.socket.send_multipart(pending_acks.pop(0)[1])
+        if item is None:
+            continue
+        header, jpg_buffer = item
+        if bandwidth:
+            time.sleep(len(jpg_buffer) * 8 / (bandwidth * 1e6))
+        # the bench puts perf_counter time in the timestamp field
+        latencies.append(time.perf_counter() - unpack_header(header).timestamp)
+        if receiver.mode == "reqrep":
+            time.sleep(rtt)
+            receiver.ack()
+        elif receiver.mode == "dealer":
+            pending_acks.append((time.perf_counter() + rtt, receiver.pending_ack))
+            receiver.pending_ack = None
+    # let the sender collect remaining acks
+    for _, ack in pending_acks:
+        receiver.socket.send_multipart(ack)
+    done.set()
+
+
+def bench(mode, jpg_buffer, frames, rtt, bandwidth, max_in_flight, port, source_fps):
+    receiver = FrameTransportReceiver(open_port=f"tcp://127.0.0.1:{port}", mode=mode)
+    sender = FrameTransportSender(
+        f"tcp://127.0.0.1:{port}", mode=mode, max_in_flight=max_in_flight
+    )
+    latencies = []
+    done = threading.Event()
+    thread = threading.Thread(
+        target=receiver_loop, args=(receiver, frames, rtt, bandwidth, latencies, done)
+    )
+    thread.start()
+    start = time.perf_counter()
+    for i in range(frames):
+        # frame i is captured at a fixed rate, latency includes waiting for the sender
+        captured = start + i / source_fps if source_fps else start
+        delay = captured - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        frame = GeorefFrame(None, DroneData(), f"frame_{i}", timestamp=captured)
+        sender.send(pack_header(frame, i), jpg_buffer)
+    done.wait()
+    elapsed = time.perf_counter() - start
+    thread.join()
+    sender.close()
+    receiver.close()
+    latencies_ms = 1000 * np.array(latencies)
+    return frames / elapsed, latencies_ms.mean(), np.percentile(latencies_ms, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ImgSender transport benchmark")
+    parser.add_argument("-n", type=int, default=100, help="Frames per mode")
+    parser.add_argument("--rtt", type=float, default=50, help="Emulated round trip time in ms")
+    parser.add_argument("--bandwidth", type=float, default=0, help="Emulated link Mbit/s, 0 - unlimited")
+    parser.add_argument("--fps", type=float, default=10, help="Rate of frames to send, 0 - all at once")
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--samples", default="map_visualization/samples")
+    parser.add_argument("--port", type=int, default=5591)
+    args = parser.parse_args()
+
+    jpg_buffer = load_jpeg(args.samples)
+    print(f"720p JPEG {len(jpg_buffer) / 1024:.0f} KiB at {args.fps} fps, rtt {args.rtt} ms, bandwidth {args.bandwidth or 'unlimited'} Mbit/s")
+    for i, mode in enumerate(TRANSPORT_MODES):
+        fps, mean_ms, p95_ms = bench(
+            mode, jpg_buffer, args.n, args.rtt / 1000, args.bandwidth, args.max_in_flight, args.port + i, args.fps
+        )
+        print(f"{mode:7s}: {fps:7.1f} fps, latency mean {mean_ms:7.1f} ms, p95 {p95_ms:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Binary frame header sent by ImgSender next to the JPEG.
+
+Every frame is a two part ZMQ message [header, jpeg]. The header is a fixed
+little-endian struct followed by the UTF-8 frame name:
+
+  magic "GF", version, flags, frame id, capture timestamp (unix seconds),
+  lat, lon, alt, rel_alt, roll, pitch, yaw (float64, NaN when unknown),
+  JPEG quality, lane, width, height,
+  sharpness, clipped, score (float32, see image_quality),
+  tile size, tile cols, tile rows, tile mask (version 2, see tiling)
+
+Receivers reject unknown magic or versions, new fields need a new version.
+Version 1 headers (without tiles) are still read, e.g. from the disk spool.
+"""
+import math
+import struct
+from geo_frame import GeorefFrame
+from models import DroneData
+
+MAGIC = b"GF"
+VERSION = 2
+HEADER = struct.Struct("<2sBBQd7dBBHH3fHBBQ")
+HEADER_V1 = struct.Struct("<2sBBQd7dBBHH3f")
+
+FLAG_QUALITY = 0x01
+FLAG_ENCODING = 0x02
+# JPEG is an atlas of the tiles set in the mask
+FLAG_TILES = 0x04
+
+# lane codes, 0 - not set
+LANES = (None, "trigger", "preview", "periodic")
+NAN = float("nan")
+
+
+def _or_nan(value):
+    return NAN if value is None else value
+
+
+def _or_none(value):
+    return None if math.isnan(value) else value
+
+
+def _header_fields(frame: GeorefFrame, frame_id: int) -> tuple:
+    d = frame.drone_data
+    flags = 0
+    quality, width, height = 0, 0, 0
+    if frame.encoding:
+        flags |= FLAG_ENCODING
+        quality, width, height = frame.encoding["quality"], frame.encoding["width"], frame.encoding["height"]
+    scores = (NAN, NAN, NAN)
+    if frame.quality:
+        flags |= FLAG_QUALITY
+        scores = (frame.quality["sharpness"], frame.quality["clipped"], frame.quality["score"])
+    tiles = (0, 0, 0, 0)
+    if frame.tiles:
+        flags |= FLAG_TILES
+        tiles = (frame.tiles["size"], frame.tiles["cols"], frame.tiles["rows"], frame.tiles["mask"])
+    return (
+        MAGIC,
+        VERSION,
+        flags,
+        frame_id,
+        _or_nan(frame.timestamp),
+        _or_nan(d.lat),
+        _or_nan(d.lon),
+        _or_nan(d.alt),
+        _or_nan(d.rel_alt),
+        _or_nan(d.roll),
+        _or_nan(d.pitch),
+        _or_nan(d.yaw),
+        quality,
+        LANES.index(frame.lane),
+        width,
+        height,
+        *scores,
+        *tiles,
+    )
+
+
+def pack_header(frame: GeorefFrame, frame_id: int = 0) -> bytes:
+    return HEADER.pack(*_header_fields(frame, frame_id)) + frame.name.encode()
+
+
+def unpack_header(header, jpg_buffer=None) -> GeorefFrame:
+    """GeorefFrame (without image) described by header, raises ValueError on unknown format."""
+    header = memoryview(header)
+    version = header[2] if len(header) > 2 else None
+    layout = HEADER_V1 if version == 1 else HEADER
+    if len(header) < layout.size:
+        raise ValueError(f"Frame header too short: {len(header)} bytes")
+    fields = layout.unpack_from(header)
+    if version == 1:
+        fields += (0, 0, 0, 0)
+    (
+        magic,
+        version,
+        flags,
+        frame_id,
+        timestamp,
+        lat,
+        lon,
+        alt,
+        rel_alt,
+        roll,
+        pitch,
+        yaw,
+        quality,
+        lane,
+        width,
+        height,
+        sharpness,
+        clipped,
+        score,
+        tile_size,
+        tile_cols,
+        tile_rows,
+        tile_mask,
+    ) = fields
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError(f"Unsupported frame header {bytes(magic)!r} version {version}")
+    drone_data = DroneData(
+        _or_none(lat),
+        _or_none(lon),
+        _or_none(alt),
+        _or_none(rel_alt),
+        _or_none(roll),
+        _or_none(pitch),
+        _or_none(yaw),
+    )
+    frame = GeorefFrame(
+        None,
+        drone_data,
+        str(header[layout.size :], "utf-8"),
+        jpg_buffer=jpg_buffer,
+        lane=LANES[lane],
+        timestamp=_or_none(timestamp),
+        frame_id=frame_id,
+    )
+    if flags & FLAG_ENCODING:
+        frame.encoding = {"quality": quality, "width": width, "height": height}
+    if flags & FLAG_QUALITY:
+        # scores are float32 on the wire
+        frame.quality = {"sharpness": round(sharpness, 1), "clipped": round(clipped, 4), "score": round(score, 1)}
+    if flags & FLAG_TILES:
+        frame.tiles = {"size": tile_size, "cols": tile_cols, "rows": tile_rows, "mask": tile_mask}
+    return frame
@@ -0,0 +1,79 @@
+"""Loopback benchmark of copying vs zero-copy frame sends.
+
+Sender and receiver run in one process over tcp://127.0.0.1 in push mode and
+send the same JPEG as fast as possible. Throughput is reported in MB/s and CPU
+time (all threads, ZMQ I/O threads included) per frame, for 720p and 1080p.
+
+Usage:
+  python zerocopy_bench.py -n 2000 --quality 95
+"""
+import argparse
+import threading
+import time
+
+from geo_frame import GeorefFrame
+from models import DroneData
+from transport import FrameTransportReceiver, FrameTransportSender
+from transport_bench import load_jpeg
+from wire_format import pack_header, unpack_header
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def receiver_loop(receiver, frames, received):
+    while received[0] < frames:
+        item = receiver.recv(timeout=1.0)
+        if item is None:
+            break
+        header, jpg_buffer = item
+        unpack_header(header, jpg_buffer)
+        received[0] += 1
+        received[1] += len(jpg_buffer)
+
+
+def bench(jpg_buffer, frames, zero_copy, port):
+    receiver = FrameTransportReceiver(open_port=f"tcp://127.0.0.1:{port}", mode="push", zero_copy=zero_copy)
+    sender = FrameTransportSender(f"tcp://127.0.0.1:{port}", mode="push", send_hwm=10, zero_copy=zero_copy)
+    frame = GeorefFrame(None, DroneData(50.0, 18.0, 300.0, 100.0, 0.0, 0.0, 90.0), "frame_0000.jpg")
+    received = [0, 0]
+    thread = threading.Thread(target=receiver_loop, args=(receiver, frames, received))
+    thread.start()
+    start, cpu_start = time.perf_counter(), time.process_time()
+    for i in range(frames):
+        sender.send(pack_header(frame, i), jpg_buffer)
+    thread.join()
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    sender.close()
+    receiver.close()
+    count = max(received[0], 1)
+    return received[1] / elapsed / 1e6, 1000 * cpu / count, received[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zero-copy frame send benchmark")
+    parser.add_argument("-n", type=int, default=2000, help="Frames per measurement")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG quality of the sent frame")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the best one is reported")
+    parser.add_argument("--samples", default="map_visualization/samples")
+    parser.add_argument("--port", type=int, default=5691)
+    args = parser.parse_args()
+
+    port = args.port
+    for label, (width, height) in RESOLUTIONS.items():
+        jpg_buffer = load_jpeg(args.samples, width, height, args.quality)
+        print(f"{label} JPEG {len(jpg_buffer) / 1024:.0f} KiB at quality {args.quality}")
+        for zero_copy in (False, True):
+            runs = []
+            for _ in range(args.repeat):
+                runs.append(bench(jpg_buffer, args.n, zero_copy, port))
+                port += 1
+            mb_s, cpu_ms, received = max(runs)
+            lost = f", {args.n - received} lost" if received < args.n else ""
+            print(
+                f"  {'zero-copy' if zero_copy else 'copy':9s}: {mb_s:8.1f} MB/s, "
+                f"CPU {cpu_ms:6.3f} ms/frame{lost}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,15 @@
 import cv2
-import imagezmq
-import json
-from geo_frame import GeorefFrame, DroneData
+import simplejpeg
+from transport import FrameTransportReceiver
+from wire_format import unpack_header
 
-image_hub = imagezmq.ImageHub(open_port="tcp://*:5001")
+receiver = FrameTransportReceiver(open_port="tcp://*:5001", mode="dealer")
 while True:
-    meta_str, image = image_hub.recv_image()
-    meta_dict = json.loads(meta_str)
-    frame = GeorefFrame.from_dict(image, meta_dict)
+    header, jpg_buffer = receiver.recv()
+    frame = unpack_header(header, jpg_buffer)
+    frame.image = simplejpeg.decode_jpeg(jpg_buffer, colorspace="BGR")
     print(frame.drone_data)
 
     cv2.imshow("frame", frame.image)
     cv2.waitKey(1)
-    image_hub.send_reply(b"OK")
+    receiver.ack()